@@ -1,10 +1,10 @@
-import os
-
 import altair as alt
-import boto3
 import pandas as pd
 import streamlit as st
 
+from dashboard_data import dashboard_tables
+from storage import get_storage
+
 pct_scale = alt.Scale(domain=(0, 1))
 
 st.set_page_config(
@@ -15,37 +15,26 @@ st.set_page_config(
 
 st.title("ALEC: Active Learning Experiment Credit")
 
-alt.data_transformers.disable_max_rows()
 
-bucket_name = os.getenv("S3_BUCKET_NAME")
+@st.cache(show_spinner=False)
+def load_table(key: str, version: str) -> pd.DataFrame:
+    """
+    Dashboard table, cached until generate_summary_data.py rewrites it (changing its version).
+    """
+    return get_storage().read_table(key)
 
-s3 = boto3.resource("s3")
-s3_alec = s3.Bucket(bucket_name)
-
-# Visualize Synthetic Data
 
-simulation_ids = [f.key for f in s3_alec.objects.filter(Prefix="synthetic_data/")]
-simulation_ids = [
-    simulation_id.split("/")[1].split(".")[0] for simulation_id in simulation_ids
-]
+def get_table(name: str) -> pd.DataFrame:
+    key = dashboard_tables[name]
+    return load_table(key, get_storage().get_version(key))
 
-df = pd.DataFrame()
 
-for simulation_id in simulation_ids:
-    raw_df = pd.read_parquet(
-        f"s3://{bucket_name}/synthetic_data/{simulation_id}.parquet"
-    )
-    raw_df = raw_df.loc[raw_df.simulation_id == simulation_id].copy()
-    raw_df.reset_index(inplace=True, drop=True)
-    df = df.append(raw_df)
+# Visualize Synthetic Data
 
-df_summary = (
-    df.groupby(["application_date", "simulation_id"]).default.mean().reset_index()
-)
-# Empty bucket of alec objects
+df_default_rates = get_table("synthetic_default_rates")
 
 p1 = (
-    alt.Chart(df_summary)
+    alt.Chart(get_table("synthetic_default_rate_samples"))
     .mark_point()
     .encode(
         y=alt.Y(
@@ -64,15 +53,16 @@ p1 = (
 )
 
 p11 = (
-    alt.Chart(df_summary)
-    .mark_errorband(extent="ci", opacity=0.2)
+    alt.Chart(df_default_rates)
+    .mark_area(opacity=0.2)
     .encode(
         y=alt.Y(
-            "default",
+            "ci_lower",
             title="Default Rate",
             scale=pct_scale,
             axis=alt.Axis(format="%"),
         ),
+        y2="ci_upper",
         x=alt.X(
             "application_date:N",
             title="Application Date",
@@ -83,7 +73,7 @@ p11 = (
 
 p12 = p11.mark_line().encode(
     y=alt.Y(
-        "mean(default)",
+        "default",
         title="Default Rate",
         scale=pct_scale,
         axis=alt.Axis(format="%"),
@@ -95,24 +85,16 @@ p1 = p1.properties(height=500, width=1000, title="Simulation Defaults over Time"
 
 st.write(p1)
 
-df_long = pd.melt(df, id_vars=["application_date", "simulation_id"])
-df_long = df_long.loc[
-    df_long.variable.isin(
-        [
-            "age",
-            "idiosyncratic_individual_risk",
-            "total_default_risk_log_odds",
-        ]
-    )
-].copy()
-df_long.loc[:, "value"] = df_long.value.astype(float)
-df_long.loc[:, "variable"] = df_long.variable.str.title().str.replace("_", " ")
+# NOTE: Cached tables are shared between sessions, so they are not modified in place
+df_densities = get_table("synthetic_densities")
+df_densities = df_densities.assign(
+    variable=df_densities.variable.str.title().str.replace("_", " ")
+)
 
-# Based on Altair Example: https://altair-viz.github.io/user_guide/transform/density.html#density-transform
 p2 = (
     alt.Chart(
-        df_long[
-            df_long.variable.isin(
+        df_densities[
+            df_densities.variable.isin(
                 [
                     "Idiosyncratic Individual Risk",
                     "Total Default Risk Log Odds",
@@ -123,14 +105,9 @@ p2 = (
         width=100,
         height=100,
     )
-    .transform_density(
-        "value",
-        groupby=["variable", "application_date"],
-        as_=["risk_score", "density"],
-    )
     .mark_line(opacity=0.8)
     .encode(
-        x=alt.X("risk_score:Q", title="Log Odds Scale"),
+        x=alt.X("value:Q", title="Log Odds Scale"),
         y=alt.Y("density:Q", title="Density"),
         color=alt.Color("variable:N", title="Application Date"),
     )
@@ -144,19 +121,19 @@ p2 = (
 st.write(p2)
 
 p3 = (
-    alt.Chart(df, height=200, width=200, title="Risk Score Distribution")
-    .transform_density(
-        "age",
-        groupby=["application_date"],
-        as_=["total_default_risk", "density"],
-        extent=[0, 1],
+    alt.Chart(
+        df_densities[df_densities.variable == "Total Default Risk"],
+        height=200,
+        width=200,
+        title="Risk Score Distribution",
     )
     .mark_line()
     .encode(
         x=alt.X(
-            "total_default_risk:Q",
+            "value:Q",
             title="Default Probability",
             axis=alt.Axis(format="%"),
+            scale=pct_scale,
         ),
         y=alt.Y("density:Q", title="Density"),
     )
@@ -169,7 +146,7 @@ p3 = (
 st.write(p3)
 
 p5 = (
-    alt.Chart(df, height=200, width=200)
+    alt.Chart(get_table("synthetic_risk_samples"), height=200, width=200)
     .mark_point()
     .encode(
         y=alt.Y(
@@ -189,15 +166,11 @@ p5 = (
 
 st.write(p5)
 
-df_summary_full = pd.read_parquet(f"s3://{bucket_name}/dashboard/summary_data.parquet")
-
-df_plot = df_summary_full[df_summary_full.application_date > 2020].copy()
-
 pp_scale = alt.Scale(domain=(-1, 1))
 
 
 a = (
-    alt.Chart(df_plot)
+    alt.Chart(get_table("portfolio_default_rate_samples"))
     .mark_point(opacity=0.1)
     .encode(
         x=alt.X(
@@ -222,14 +195,14 @@ b = b.facet(
 st.write(b)
 
 d = (
-    alt.Chart(df_plot)
+    alt.Chart(get_table("portfolio_default_rates"))
     .mark_line()
     .encode(
         x=alt.X(
             "application_date:N", title="Application Date", axis=alt.Axis(labelAngle=0)
         ),
         y=alt.Y(
-            "mean(counterfactual_default)",
+            "counterfactual_default",
             title="Default Rate",
             axis=alt.Axis(format="%"),
             scale=pct_scale,
@@ -238,7 +211,19 @@ d = (
     )
 )
 
-c = a.mark_errorband(extent="ci", opacity=0.2) + d + d.mark_point()
+c = (
+    d.mark_area(opacity=0.2).encode(
+        y=alt.Y(
+            "ci_lower",
+            title="Default Rate",
+            axis=alt.Axis(format="%"),
+            scale=pct_scale,
+        ),
+        y2="ci_upper",
+    )
+    + d
+    + d.mark_point()
+)
 
 c = c.properties(height=300, width=250)
 c = c.facet(
@@ -247,49 +232,15 @@ c = c.facet(
 )
 st.write(c)
 
-
-no_active_learning_results = (
-    df_summary_full.loc[
-        df_summary_full.portfolio.isin(["business", "research"])
-        & (df_summary_full.research_acceptance_rate == 0)
-    ]
-    .groupby("simulation_id")
-    .counterfactual_default.mean()
-).reset_index()
-
-no_active_learning_results.rename(
-    columns={"counterfactual_default": "no_active_learning_default"}, inplace=True
-)
 # Business Portfolio Uplift
 
-active_learning_results = (
-    df_summary_full.loc[df_summary_full.portfolio.isin(["business", "research"])]
-    .groupby(
-        [
-            "simulation_id",
-            "active_learning_spec",
-            "research_acceptance_rate",
-            "portfolio",
-        ]
-    )
-    .counterfactual_default.mean()
-    .reset_index()
-)
-
-active_learning_results = pd.merge(
-    active_learning_results, no_active_learning_results, on="simulation_id", how="left"
-)
-
-# Net Uplift with Research Portfolio
-active_learning_results["net_default_rate_effect"] = (
-    active_learning_results["counterfactual_default"]
-    - active_learning_results["no_active_learning_default"]
-)
+# NOTE: Faceted layers share their data, so aggregates (with n_simulations) and samples are stacked
+df_uplift = pd.concat([get_table("uplift"), get_table("uplift_samples")])
+is_aggregate = "isValid(datum.n_simulations)"
 
 a = (
-    alt.Chart(
-        active_learning_results.loc[active_learning_results.portfolio == "business"]
-    )
+    alt.Chart(df_uplift)
+    .transform_filter(f"!{is_aggregate}")
     .mark_point(opacity=0.1)
     .encode(
         x=alt.X(
@@ -306,15 +257,25 @@ a = (
     )
 )
 
-d = a.encode(
-    y=alt.Y(
-        "mean(net_default_rate_effect)",
-        title="Net Default Rate Effect (Business Portfolio), in p.p.",
+d = (
+    alt.Chart(df_uplift)
+    .transform_filter(is_aggregate)
+    .mark_line()
+    .encode(
+        x=alt.X(
+            "research_acceptance_rate:N",
+            title="Business to Research Ratio",
+            axis=alt.Axis(labelAngle=0),
+        ),
+        y=alt.Y(
+            "net_default_rate_effect",
+            title="Net Default Rate Effect (Business Portfolio), in p.p.",
+        ),
+        color="portfolio",
     )
 )
 
-
-b = d.mark_errorband(extent="ci", opacity=0.2) + d.mark_line() + a
+b = d.mark_area(opacity=0.2).encode(y="ci_lower", y2="ci_upper") + d + a
 
 b = b.properties(height=300, width=250)
 
@@ -0,0 +1,220 @@
+"""
+Pre-aggregated tables behind the dashboard charts, built by generate_summary_data.py.
+
+Charts are fed with per-date aggregates, densities and the rows of a bounded sample of
+simulations, so the size of every table is independent of the number of simulations.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from stats import binned_kde, bootstrap_mean_ci
+
+dashboard_tables = {
+    "synthetic_default_rates": "dashboard/synthetic_default_rates.parquet",
+    "synthetic_default_rate_samples": "dashboard/synthetic_default_rate_samples.parquet",
+    "synthetic_densities": "dashboard/synthetic_densities.parquet",
+    "synthetic_risk_samples": "dashboard/synthetic_risk_samples.parquet",
+    "portfolio_default_rates": "dashboard/portfolio_default_rates.parquet",
+    "portfolio_default_rate_samples": "dashboard/portfolio_default_rate_samples.parquet",
+    "uplift": "dashboard/uplift.parquet",
+    "uplift_samples": "dashboard/uplift_samples.parquet",
+}
+
+# NOTE: Fixed bin widths make per-simulation histograms additive, whatever the data range.
+# Densities are estimated from the pooled histograms, so bins are narrow relative to the bandwidth.
+histogram_bin_widths = {
+    "age": 0.1,
+    "idiosyncratic_individual_risk": 0.1,
+    "total_default_risk_log_odds": 0.1,
+    "total_default_risk": 0.01,
+}
+
+# NOTE: Charts show individual simulations for at most this many simulations
+max_sample_simulations = int(os.getenv("DASHBOARD_MAX_SIMULATIONS", 100))
+max_sample_rows = int(os.getenv("DASHBOARD_MAX_SAMPLE_ROWS", 5_000))
+
+
+def get_sample_simulation_ids(simulation_ids) -> list:
+    """
+    Deterministic sample of simulations whose individual results are charted.
+    """
+    return sorted(simulation_ids)[:max_sample_simulations]
+
+
+def get_synthetic_partials(raw_df: pd.DataFrame):
+    """
+    Default counts per application_date, histogram bin counts per (variable,
+    application_date) and a sample of rows of one simulation's synthetic data.
+    """
+    default_partials_df = (
+        raw_df.groupby(["simulation_id", "application_date"])
+        .default.agg(["sum", "count"])
+        .reset_index()
+    )
+
+    histogram_partials_dfs = []
+    for variable, bin_width in histogram_bin_widths.items():
+        values = raw_df[variable].astype("float64")
+        bin_df = pd.DataFrame(
+            {
+                "simulation_id": raw_df.simulation_id,
+                "application_date": raw_df.application_date,
+                "variable": variable,
+                "bin": np.floor(values / bin_width).astype("int64"),
+            }
+        )[values.notna()]
+        histogram_partials_dfs.append(
+            bin_df.groupby(["simulation_id", "application_date", "variable", "bin"])
+            .size()
+            .rename("count")
+            .reset_index()
+        )
+    histogram_partials_df = pd.concat(histogram_partials_dfs, ignore_index=True)
+
+    # NOTE: Sized so that the samples of all charted simulations stay within max_sample_rows
+    risk_sample_df = raw_df[
+        ["simulation_id", "application_date", "age", "total_default_risk"]
+    ].sample(
+        min(max_sample_rows // max_sample_simulations, raw_df.shape[0]), random_state=0
+    )
+    return default_partials_df, histogram_partials_df, risk_sample_df
+
+
+def get_densities(histogram_partials_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Kernel density estimates per (variable, application_date), pooled over all simulations.
+    """
+    histogram_df = (
+        histogram_partials_df.groupby(["variable", "application_date", "bin"])["count"]
+        .sum()
+        .reset_index()
+    )
+    density_dfs = []
+    for (variable, application_date), df in histogram_df.groupby(
+        ["variable", "application_date"]
+    ):
+        bin_width = histogram_bin_widths[variable]
+        value, density = binned_kde(
+            (df["bin"] + 0.5) * bin_width, df["count"], bin_width
+        )
+        density_dfs.append(
+            pd.DataFrame(
+                {
+                    "variable": variable,
+                    "application_date": application_date,
+                    "value": value,
+                    "density": density,
+                }
+            )
+        )
+    return pd.concat(density_dfs, ignore_index=True)
+
+
+def build_synthetic_tables(
+    default_partials_df: pd.DataFrame,
+    histogram_partials_df: pd.DataFrame,
+    risk_samples_df: pd.DataFrame,
+) -> dict:
+    """
+    Dashboard tables describing the synthetic data.
+    """
+    default_rate_df = default_partials_df.assign(
+        default=default_partials_df["sum"] / default_partials_df["count"]
+    )[["simulation_id", "application_date", "default"]]
+    sample_simulation_ids = get_sample_simulation_ids(
+        default_rate_df.simulation_id.unique()
+    )
+    return {
+        "synthetic_default_rates": bootstrap_mean_ci(
+            default_rate_df, "application_date", "default"
+        ),
+        "synthetic_default_rate_samples": default_rate_df.loc[
+            default_rate_df.simulation_id.isin(sample_simulation_ids)
+        ],
+        "synthetic_densities": get_densities(histogram_partials_df),
+        "synthetic_risk_samples": risk_samples_df.loc[
+            risk_samples_df.simulation_id.isin(sample_simulation_ids)
+        ],
+    }
+
+
+def build_summary_tables(df_summary_full: pd.DataFrame) -> dict:
+    """
+    Dashboard tables describing the simulation results, from the per-run summary.
+    """
+    sample_simulation_ids = get_sample_simulation_ids(
+        df_summary_full.simulation_id.unique()
+    )
+    df_plot = df_summary_full[df_summary_full.application_date > 2020]
+
+    portfolio_default_rate_df = bootstrap_mean_ci(
+        df_plot,
+        [
+            "active_learning_spec",
+            "research_acceptance_rate",
+            "application_date",
+            "portfolio",
+        ],
+        "counterfactual_default",
+    )
+
+    no_active_learning_results = (
+        df_summary_full.loc[
+            df_summary_full.portfolio.isin(["business", "research"])
+            & (df_summary_full.research_acceptance_rate == 0)
+        ]
+        .groupby("simulation_id")
+        .counterfactual_default.mean()
+    ).reset_index()
+
+    no_active_learning_results.rename(
+        columns={"counterfactual_default": "no_active_learning_default"}, inplace=True
+    )
+
+    active_learning_results = (
+        df_summary_full.loc[df_summary_full.portfolio.isin(["business", "research"])]
+        .groupby(
+            [
+                "simulation_id",
+                "active_learning_spec",
+                "research_acceptance_rate",
+                "portfolio",
+            ]
+        )
+        .counterfactual_default.mean()
+        .reset_index()
+    )
+
+    active_learning_results = pd.merge(
+        active_learning_results,
+        no_active_learning_results,
+        on="simulation_id",
+        how="left",
+    )
+
+    # Net Uplift with Research Portfolio
+    active_learning_results["net_default_rate_effect"] = (
+        active_learning_results["counterfactual_default"]
+        - active_learning_results["no_active_learning_default"]
+    )
+    business_results = active_learning_results.loc[
+        active_learning_results.portfolio == "business"
+    ]
+
+    return {
+        "portfolio_default_rates": portfolio_default_rate_df,
+        "portfolio_default_rate_samples": df_plot.loc[
+            df_plot.simulation_id.isin(sample_simulation_ids)
+        ],
+        "uplift": bootstrap_mean_ci(
+            business_results,
+            ["active_learning_spec", "research_acceptance_rate", "portfolio"],
+            "net_default_rate_effect",
+        ),
+        "uplift_samples": business_results.loc[
+            business_results.simulation_id.isin(sample_simulation_ids)
+        ],
+    }
@@ -1,95 +1,419 @@
+"""
+Summarize synthetic data and simulation results for the dashboard, incrementally from per-run
+partial aggregates (pass --full to rebuild from scratch).
+"""
+
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
 import pandas as pd
 
-bucket_name = os.getenv("S3_BUCKET_NAME")
+from dashboard_data import (
+    build_summary_tables,
+    build_synthetic_tables,
+    dashboard_tables,
+    get_synthetic_partials,
+    histogram_bin_widths,
+)
+from storage import get_partition_value, get_simulation_id, get_storage, open_storage
 
-s3 = boto3.resource("s3")
-s3_alec = s3.Bucket(bucket_name)
+# NOTE: Synthetic data and the dashboard's tables are in the storage, results where main.py wrote them
+storage = get_storage()
+results = open_storage(os.getenv("RESULTS_URI", storage.root_uri))
 
-simulation_ids_list = []
-scenario_ids_list = []
+run_indices = ["scenario_id", "simulation_id"]
+partial_indices = [*run_indices, "application_date", "portfolio"]
+groupby_indices = [
+    "simulation_id",
+    "application_date",
+    "research_acceptance_rate",
+    "active_learning_spec",
+]
+application_cols = [
+    "simulation_id",
+    "application_id",
+    "application_date",
+    "counterfactual_default",
+]
+portfolio_cols = ["simulation_id", "application_id", "portfolio"]
+synthetic_cols = ["simulation_id", "application_date", "default", *histogram_bin_widths]
 
-# Fetch simulation data
-for i in ["applications", "outcomes", "portfolios", "scenarios"]:
-    file_paths_tmp = [f.key for f in s3_alec.objects.filter(Prefix=f"{i}/")]
-    simulation_ids_tmp = [
-        simulation_id.split("/")[2].split(".")[0] for simulation_id in file_paths_tmp
-    ]
-    simulation_ids_list.extend(simulation_ids_tmp)
+manifest_key = "dashboard/summary_manifest.parquet"
+manifest_cols = [
+    *run_indices,
+    "applications_key",
+    "applications_version",
+    "portfolios_key",
+    "portfolios_version",
+]
+partials_key = "dashboard/summary_partials.parquet"
+partials_cols = [*partial_indices, "sum", "count"]
 
-    scenario_ids_tmp = [simulation_id.split("/")[1] for simulation_id in file_paths_tmp]
-    scenario_ids_list.extend(scenario_ids_tmp)
+synthetic_manifest_key = "dashboard/synthetic_manifest.parquet"
+synthetic_manifest_cols = ["simulation_id", "key", "version"]
+synthetic_partials_keys = {
+    "default": "dashboard/synthetic_default_partials.parquet",
+    "histogram": "dashboard/synthetic_histogram_partials.parquet",
+    "risk_sample": "dashboard/synthetic_risk_sample_partials.parquet",
+}
+synthetic_partials_cols = {
+    "default": ["simulation_id", "application_date", "sum", "count"],
+    "histogram": ["simulation_id", "application_date", "variable", "bin", "count"],
+    "risk_sample": ["simulation_id", "application_date", "age", "total_default_risk"],
+}
 
-simulation_ids = pd.DataFrame({"simulation_id": simulation_ids_list})
-simulation_ids = simulation_ids.value_counts().reset_index()
-simulation_ids = simulation_ids.loc[
-    simulation_ids.loc[:, 0] == simulation_ids.loc[:, 0].max(), "simulation_id"
-].tolist()
 
-scenario_ids = pd.DataFrame({"scenario_id": scenario_ids_list})
-scenario_ids = scenario_ids.value_counts().reset_index()
-scenario_ids = scenario_ids.loc[
-    scenario_ids.loc[:, 0] == scenario_ids.loc[:, 0].max(), "scenario_id"
-].tolist()
+def read_state(key: str, columns) -> pd.DataFrame:
+    """
+    Previously saved summary state, or an empty frame.
+    """
+    if storage.exists(key):
+        return storage.read_table(key)
+    return pd.DataFrame(columns=columns)
 
-df_summary_full = pd.DataFrame()
 
-# Join together simulation data and calculate summary statistics
-for scenario_id in scenario_ids:
-    for simulation_id in simulation_ids:
-        print(f"Scenario: {scenario_id}, Simulation: {simulation_id}")
+def concat_frames(dfs, columns) -> pd.DataFrame:
+    """
+    Concatenate the non-empty frames of dfs, which keeps dtypes of empty (e.g. new) state out.
+    """
+    dfs = [df for df in dfs if df.shape[0] > 0]
+    if not dfs:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(dfs, ignore_index=True)
 
-        app_df = pd.read_parquet(
-            f"s3://{bucket_name}/applications/{scenario_id}/{simulation_id}.parquet"
-        )
-        outcome_df = pd.read_parquet(
-            f"s3://{bucket_name}/outcomes/{scenario_id}/{simulation_id}.parquet"
-        )
-        portfolio_df = pd.read_parquet(
-            f"s3://{bucket_name}/portfolios/{scenario_id}/{simulation_id}.parquet"
+
+def read_parts(keys, columns, simulation_ids=None) -> pd.DataFrame:
+    """
+    Rows of the given part files (optionally of some simulations only), tagged with their key.
+    """
+    dfs = []
+    for key in keys:
+        df = results.read_part(key, columns=columns).assign(part_key=key)
+        # NOTE: Ids and portfolios are stored dictionary-encoded, with categories per part file
+        df = df.astype(
+            {
+                column: "object"
+                for column in columns
+                if isinstance(df[column].dtype, pd.CategoricalDtype)
+            }
         )
-        scenario_df = pd.read_parquet(
-            f"s3://{bucket_name}/scenarios/{scenario_id}/{simulation_id}.parquet"
+        if simulation_ids is not None:
+            df = df.loc[df.simulation_id.isin(simulation_ids)]
+        dfs.append(df)
+    return concat_frames(dfs, [*columns, "scenario_id", "part_key"])
+
+
+def get_unread_keys(manifest_df, scenario_id, simulation_ids, table, read_keys):
+    """
+    Part files of table which hold rows of the given runs, but have not been read.
+    """
+    manifest_df = manifest_df.loc[
+        (manifest_df.scenario_id == scenario_id)
+        & manifest_df.simulation_id.isin(simulation_ids)
+    ]
+    keys = set(manifest_df[f"{table}_key"].dropna()) & set(parts[table])
+    return sorted(keys - set(read_keys))
+
+
+def summarize_scenario(scenario_id, app_keys, portfolio_keys, manifest_df):
+    """
+    Partial aggregates and manifest rows of the runs in new or changed part files of a scenario.
+    """
+    app_df = read_parts(app_keys, application_cols)
+    portfolio_df = read_parts(portfolio_keys, portfolio_cols)
+
+    # NOTE: Rows of a run in the other table may sit in a part file which did not change
+    missing_app_simulation_ids = set(portfolio_df.simulation_id) - set(
+        app_df.simulation_id
+    )
+    missing_portfolio_simulation_ids = set(app_df.simulation_id) - set(
+        portfolio_df.simulation_id
+    )
+    app_df = concat_frames(
+        [
+            app_df,
+            read_parts(
+                get_unread_keys(
+                    manifest_df,
+                    scenario_id,
+                    missing_app_simulation_ids,
+                    "applications",
+                    app_keys,
+                ),
+                application_cols,
+                missing_app_simulation_ids,
+            ),
+        ],
+        [*application_cols, "scenario_id", "part_key"],
+    )
+    portfolio_df = concat_frames(
+        [
+            portfolio_df,
+            read_parts(
+                get_unread_keys(
+                    manifest_df,
+                    scenario_id,
+                    missing_portfolio_simulation_ids,
+                    "portfolios",
+                    portfolio_keys,
+                ),
+                portfolio_cols,
+                missing_portfolio_simulation_ids,
+            ),
+        ],
+        [*portfolio_cols, "scenario_id", "part_key"],
+    )
+
+    df = pd.merge(
+        app_df.drop(columns="part_key"),
+        portfolio_df.drop(columns=["scenario_id", "part_key"]),
+        on=["application_id", "simulation_id"],
+        how="left",
+    )
+    df.portfolio = df.portfolio.fillna("rejected_application")
+
+    partials_df = (
+        df.groupby(partial_indices)
+        .counterfactual_default.agg(["sum", "count"])
+        .reset_index()
+    )
+
+    run_manifest_df = pd.merge(
+        app_df.groupby("simulation_id").part_key.first().rename("applications_key"),
+        portfolio_df.groupby("simulation_id").part_key.first().rename("portfolios_key"),
+        left_index=True,
+        right_index=True,
+        how="left",
+    ).reset_index()
+    run_manifest_df["scenario_id"] = scenario_id
+    for table in ["applications", "portfolios"]:
+        run_manifest_df[f"{table}_version"] = run_manifest_df[f"{table}_key"].map(
+            parts[table]
         )
 
-        df = pd.merge(
-            app_df, portfolio_df, on=["application_id", "simulation_id"], how="left"
+    return partials_df, run_manifest_df[manifest_cols]
+
+
+def summarize_simulation(simulation_id):
+    """
+    Partial aggregates of the synthetic data of a simulation.
+    """
+    raw_df = storage.read_synthetic_data(simulation_id, columns=synthetic_cols)
+    raw_df = raw_df.loc[raw_df.simulation_id == simulation_id]
+    return get_synthetic_partials(raw_df)
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "--full", action="store_true", help="ignore previous state and summarize all runs"
+)
+args = parser.parse_args()
+
+# Find new or changed result files
+parts = {table: results.list_parts(table) for table in ["applications", "portfolios"]}
+
+if args.full:
+    manifest_df = pd.DataFrame(columns=manifest_cols)
+    partials_df = pd.DataFrame(columns=partials_cols)
+else:
+    manifest_df = read_state(manifest_key, manifest_cols)
+    partials_df = read_state(partials_key, partials_cols)
+
+# NOTE: A run is up to date if none of the part files it was read from changed or disappeared
+is_up_to_date = pd.Series(True, index=manifest_df.index)
+for table in ["applications", "portfolios"]:
+    current_versions = manifest_df[f"{table}_key"].map(parts[table])
+    is_up_to_date &= manifest_df[f"{table}_key"].isna() | (
+        current_versions == manifest_df[f"{table}_version"]
+    )
+kept_manifest_df = manifest_df.loc[is_up_to_date]
+
+changed_keys = {
+    table: sorted(
+        set(table_parts.items())
+        - set(
+            zip(kept_manifest_df[f"{table}_key"], kept_manifest_df[f"{table}_version"])
         )
-        df = pd.merge(
-            df,
-            outcome_df,
-            on=["application_id", "simulation_id"],
-            how="left",
+    )
+    for table, table_parts in parts.items()
+}
+changed_scenario_ids = sorted(
+    {
+        get_partition_value(key)
+        for table_changed_keys in changed_keys.values()
+        for key, _ in table_changed_keys
+    }
+)
+
+# NOTE: Scenarios are downloaded and joined concurrently, while earlier ones are collected
+new_partials_dfs = []
+new_manifest_dfs = []
+with ThreadPoolExecutor(int(os.getenv("SUMMARY_MAX_WORKERS", 4))) as executor:
+    futures = [
+        executor.submit(
+            summarize_scenario,
+            scenario_id,
+            [
+                key
+                for key, _ in changed_keys["applications"]
+                if get_partition_value(key) == scenario_id
+            ],
+            [
+                key
+                for key, _ in changed_keys["portfolios"]
+                if get_partition_value(key) == scenario_id
+            ],
+            manifest_df,
         )
-        df = pd.merge(
-            df,
-            scenario_df,
-            left_on="scenario_id",
-            right_on="id",
-            how="left",
+        for scenario_id in changed_scenario_ids
+    ]
+    for scenario_id, future in zip(changed_scenario_ids, futures):
+        scenario_partials_df, scenario_manifest_df = future.result()
+        print(
+            f"Scenario: {scenario_id}, new or changed runs: {scenario_manifest_df.shape[0]}"
         )
+        new_partials_dfs.append(scenario_partials_df)
+        new_manifest_dfs.append(scenario_manifest_df)
 
-        groupby_indices = [
-            "simulation_id",
-            "application_date",
-            "research_acceptance_rate",
-            "active_learning_spec",
-        ]
+new_partials_df = concat_frames(new_partials_dfs, partials_cols)
+new_manifest_df = concat_frames(new_manifest_dfs, manifest_cols)
 
-        df.portfolio = df.portfolio.fillna("rejected_application")
+# NOTE: Newly read runs replace any previous partial aggregates of the same run
+kept_run_ids = pd.MultiIndex.from_frame(kept_manifest_df[run_indices]).difference(
+    pd.MultiIndex.from_frame(new_manifest_df[run_indices])
+)
+manifest_df = concat_frames(
+    [
+        kept_manifest_df.loc[
+            pd.MultiIndex.from_frame(kept_manifest_df[run_indices]).isin(kept_run_ids)
+        ],
+        new_manifest_df,
+    ],
+    manifest_cols,
+)
+partials_df = concat_frames(
+    [
+        partials_df.loc[
+            pd.MultiIndex.from_frame(partials_df[run_indices]).isin(kept_run_ids)
+        ],
+        new_partials_df,
+    ],
+    partials_cols,
+)
 
-        df_summary = df.groupby(
-            [*groupby_indices, "portfolio"]
-        ).counterfactual_default.mean()
-        df_summary = df_summary.reset_index()
+# NOTE: Partials are saved before the manifest, so an interrupted run is redone next time
+storage.write_table(partials_key, partials_df)
+storage.write_table(manifest_key, manifest_df)
 
-        df_summary_all = df.groupby(groupby_indices).counterfactual_default.mean()
-        df_summary_all = df_summary_all.reset_index()
-        df_summary_all["portfolio"] = "full_dataset"
+# Combine partial aggregates into summary statistics
+run_ids = manifest_df[run_indices]
+
+# NOTE: Only summarize simulations available for all scenarios, and vice versa
+simulation_ids = run_ids.simulation_id.value_counts()
+simulation_ids = simulation_ids[simulation_ids == simulation_ids.max()].index
+
+scenario_ids = run_ids.scenario_id.value_counts()
+scenario_ids = scenario_ids[scenario_ids == scenario_ids.max()].index
+
+df_summary = partials_df.loc[
+    partials_df.simulation_id.isin(simulation_ids)
+    & partials_df.scenario_id.isin(scenario_ids)
+]
+
+# NOTE: counterfactual_default is 0 or 1, so portfolio sums add up exactly to the full dataset
+df_summary_all = (
+    df_summary.groupby(["scenario_id", "simulation_id", "application_date"])[
+        ["sum", "count"]
+    ]
+    .sum()
+    .reset_index()
+)
+df_summary_all["portfolio"] = "full_dataset"
 
-        df_summary_full = df_summary_full.append(df_summary).append(df_summary_all)
+df_summary_full = pd.concat([df_summary, df_summary_all], ignore_index=True)
+df_summary_full["counterfactual_default"] = df_summary_full["sum"].astype(
+    "float64"
+) / df_summary_full["count"].astype("float64")
 
+scenario_df = results.read_table("scenarios/scenarios.parquet")
+df_summary_full = pd.merge(
+    df_summary_full,
+    scenario_df,
+    left_on="scenario_id",
+    right_on="id",
+    how="left",
+)
+df_summary_full = df_summary_full[
+    [*groupby_indices, "portfolio", "counterfactual_default"]
+]
+
+storage.write_table("dashboard/summary_data.parquet", df_summary_full)
+
+for name, df in build_summary_tables(df_summary_full).items():
+    storage.write_table(dashboard_tables[name], df)
+
+# Find new or changed synthetic data
+synthetic_parts = storage.list_parts("synthetic_data")
+
+if args.full:
+    synthetic_manifest_df = pd.DataFrame(columns=synthetic_manifest_cols)
+    synthetic_partials_dfs = {
+        name: pd.DataFrame(columns=columns)
+        for name, columns in synthetic_partials_cols.items()
+    }
+else:
+    synthetic_manifest_df = read_state(synthetic_manifest_key, synthetic_manifest_cols)
+    synthetic_partials_dfs = {
+        name: read_state(synthetic_partials_keys[name], columns)
+        for name, columns in synthetic_partials_cols.items()
+    }
+
+kept_synthetic_manifest_df = synthetic_manifest_df.loc[
+    synthetic_manifest_df.key.map(synthetic_parts) == synthetic_manifest_df.version
+]
+changed_synthetic_parts = sorted(
+    set(synthetic_parts.items())
+    - set(zip(kept_synthetic_manifest_df.key, kept_synthetic_manifest_df.version))
+)
+print(f"New or changed simulations: {len(changed_synthetic_parts)}")
+
+new_synthetic_partials_dfs = {name: [] for name in synthetic_partials_cols}
+with ThreadPoolExecutor(int(os.getenv("SUMMARY_MAX_WORKERS", 4))) as executor:
+    futures = executor.map(
+        summarize_simulation,
+        [get_simulation_id(key) for key, _ in changed_synthetic_parts],
+    )
+    for simulation_partials_dfs in futures:
+        for name, df in zip(synthetic_partials_cols, simulation_partials_dfs):
+            new_synthetic_partials_dfs[name].append(df)
+
+new_synthetic_manifest_df = pd.DataFrame(
+    [
+        (get_simulation_id(key), key, version)
+        for key, version in changed_synthetic_parts
+    ],
+    columns=synthetic_manifest_cols,
+)
+
+# NOTE: Partials of simulations which were removed or read again are dropped
+synthetic_manifest_df = concat_frames(
+    [kept_synthetic_manifest_df, new_synthetic_manifest_df], synthetic_manifest_cols
+)
+for name, columns in synthetic_partials_cols.items():
+    kept_df = synthetic_partials_dfs[name]
+    kept_df = kept_df.loc[
+        kept_df.simulation_id.isin(kept_synthetic_manifest_df.simulation_id)
+    ]
+    synthetic_partials_dfs[name] = concat_frames(
+        [kept_df, *new_synthetic_partials_dfs[name]], columns
+    )
+    storage.write_table(synthetic_partials_keys[name], synthetic_partials_dfs[name])
+storage.write_table(synthetic_manifest_key, synthetic_manifest_df)
 
-df_summary_full.to_parquet(f"s3://{bucket_name}/dashboard/summary_data.parquet")
+for name, df in build_synthetic_tables(
+    synthetic_partials_dfs["default"],
+    synthetic_partials_dfs["histogram"],
+    synthetic_partials_dfs["risk_sample"],
+).items():
+    storage.write_table(dashboard_tables[name], df)
@@ -0,0 +1,115 @@
+"""
+Vectorized statistics for the dashboard tables, computed by the summary job instead of the browser.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def bootstrap_mean_ci(
+    df: pd.DataFrame,
+    by,
+    value: str,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Mean of value per group of by, with a percentile bootstrap confidence interval.
+
+    Groups of the same size are resampled together: the resamples are drawn once as a
+    (n_resamples, size) matrix of multinomial weights, so the bootstrap means of all those
+    groups are a single matrix product.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    df = df[[*by, value]].dropna(subset=[value])
+    groups = df.groupby(by, sort=True)
+    group_ids = groups.ngroup().to_numpy()
+    group_sizes = np.bincount(group_ids)
+    stats_df = groups[value].mean().reset_index()
+    stats_df["n_simulations"] = group_sizes
+
+    # NOTE: Values as a (group, position in group) matrix per group size
+    order = np.argsort(group_ids, kind="stable")
+    values = df[value].to_numpy(dtype="float64")[order]
+    sorted_group_ids = group_ids[order]
+    positions = np.arange(values.shape[0]) - np.repeat(
+        np.cumsum(group_sizes) - group_sizes, group_sizes
+    )
+
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    ci_lower = np.empty(group_sizes.shape[0])
+    ci_upper = np.empty(group_sizes.shape[0])
+    for size in np.unique(group_sizes):
+        size_group_ids = np.flatnonzero(group_sizes == size)
+        is_size_row = group_sizes[sorted_group_ids] == size
+        size_values = np.empty((size_group_ids.shape[0], size))
+        size_values[
+            np.searchsorted(size_group_ids, sorted_group_ids[is_size_row]),
+            positions[is_size_row],
+        ] = values[is_size_row]
+
+        weights = rng.multinomial(size, np.full(size, 1 / size), size=n_resamples)
+        resampled_means = size_values @ weights.T / size
+        ci_lower[size_group_ids], ci_upper[size_group_ids] = np.quantile(
+            resampled_means, [alpha, 1 - alpha], axis=1
+        )
+
+    stats_df["ci_lower"] = ci_lower
+    stats_df["ci_upper"] = ci_upper
+    return stats_df
+
+
+def get_weighted_quantiles(values, weights, quantiles) -> np.ndarray:
+    """
+    Quantiles of values with frequency weights, e.g. of histogram bin centers.
+    """
+    order = np.argsort(values)
+    cumulative_weights = np.cumsum(weights[order])
+    return values[order][
+        np.searchsorted(
+            cumulative_weights, np.asarray(quantiles) * cumulative_weights[-1]
+        )
+    ]
+
+
+def get_bandwidth(values, weights) -> float:
+    """
+    Gaussian kernel bandwidth by Scott's rule, as used by Vega's density transform.
+    """
+    n = weights.sum()
+    if n <= 1:
+        return 0.0
+    mean = np.average(values, weights=weights)
+    std = np.sqrt(np.average(np.square(values - mean), weights=weights) * n / (n - 1))
+    q1, q3 = get_weighted_quantiles(values, weights, [0.25, 0.75])
+    spread = min(std, (q3 - q1) / 1.34) or std or 1
+    return 1.06 * spread * n ** (-1 / 5)
+
+
+def binned_kde(
+    bin_centers, counts, bin_width: float, n_steps: int = 100, bandwidth=None
+) -> tuple:
+    """
+    Gaussian kernel density estimate from histogram bins, evaluated on n_steps points spanning
+    the bins.
+
+    Each bin counts as its center, weighted by its count, so the cost depends on the number of
+    bins only, not the number of observations.
+    """
+    bin_centers = np.asarray(bin_centers, dtype="float64")
+    counts = np.asarray(counts, dtype="float64")
+    if bandwidth is None:
+        bandwidth = max(get_bandwidth(bin_centers, counts), bin_width / 2)
+
+    grid = np.linspace(
+        bin_centers.min() - bin_width / 2, bin_centers.max() + bin_width / 2, n_steps
+    )
+    z = (grid[:, np.newaxis] - bin_centers[np.newaxis, :]) / bandwidth
+    density = (
+        np.exp(-0.5 * np.square(z))
+        @ counts
+        / (counts.sum() * bandwidth * np.sqrt(2 * np.pi))
+    )
+    return grid, density
@@ -0,0 +1,478 @@
+"""
+Microbenchmarks for hot paths of the simulation loop.
+
+Run from this directory, e.g. `python benchmarks.py membership`.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def best_time(fn, repeat=5) -> float:
+    """
+    Best wall time of repeat calls of fn, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def make_membership_data(n_applications, seed=0):
+    """
+    Applications with roughly half funded and a quarter with observed outcomes, as in a simulation.
+    """
+    rng = np.random.default_rng(seed)
+    application_df = pd.DataFrame(
+        {
+            "simulation_id": str(uuid.uuid4()),
+            "application_id": [str(uuid.uuid4()) for _ in range(n_applications)],
+            "application_code": np.arange(n_applications, dtype="int32"),
+            "age": rng.normal(1, 1, n_applications),
+        }
+    )
+    portfolio_df = application_df.sample(frac=0.5, random_state=seed)[
+        ["simulation_id", "application_id", "application_code"]
+    ].assign(portfolio="business", credit_granted=True, funding_probability=1)
+    outcome_df = portfolio_df.sample(frac=0.5, random_state=seed)[
+        ["simulation_id", "application_id", "application_code"]
+    ].assign(default=rng.integers(0, 2, portfolio_df.shape[0] // 2))
+    return application_df, portfolio_df, outcome_df
+
+
+def benchmark_membership(sizes):
+    """
+    Compare filters and joins on application_id strings with their application_code equivalents.
+    """
+    from ledger import Ledger
+    from main import prepare_training_data
+
+    rows = []
+    for n_applications in sizes:
+        application_df, portfolio_df, outcome_df = make_membership_data(n_applications)
+        portfolio_ledger = Ledger.from_frame(portfolio_df)
+        outcome_ledger = Ledger.from_frame(outcome_df)
+
+        def filter_isin():
+            return application_df.loc[
+                (
+                    ~application_df.application_id.isin(
+                        outcome_df.application_id.tolist()
+                    )
+                )
+                & (
+                    application_df.application_id.isin(
+                        portfolio_df.application_id.tolist()
+                    )
+                )
+            ]
+
+        def filter_mask():
+            # NOTE: Masks are built from scratch here; in the simulation they are carried forward
+            funded_mask = Ledger.from_frame(portfolio_df).get_code_mask(n_applications)
+            observed_mask = Ledger.from_frame(outcome_df).get_code_mask(n_applications)
+            return application_df.loc[funded_mask & ~observed_mask]
+
+        def filter_mask_incremental():
+            funded_mask = portfolio_ledger.get_code_mask(n_applications)
+            observed_mask = outcome_ledger.get_code_mask(n_applications)
+            return application_df.loc[funded_mask & ~observed_mask]
+
+        def join_merge():
+            training_df = pd.merge(
+                application_df,
+                portfolio_df,
+                on=["application_id", "simulation_id"],
+                how="left",
+            )
+            return pd.merge(
+                training_df,
+                outcome_df,
+                on=["application_id", "simulation_id"],
+                how="left",
+            )
+
+        def join_codes():
+            return prepare_training_data(application_df, portfolio_df, outcome_df)
+
+        assert filter_isin().index.equals(filter_mask().index)
+        rows.append(
+            {
+                "n_applications": n_applications,
+                "filter_isin_s": best_time(filter_isin),
+                "filter_mask_s": best_time(filter_mask),
+                "filter_mask_incremental_s": best_time(filter_mask_incremental),
+                "join_merge_s": best_time(join_merge),
+                "join_codes_s": best_time(join_codes),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def benchmark_scoring(sizes, n_scenarios=13):
+    """
+    Compare scoring applications through the sklearn pipeline with the extracted scorer, and
+    with scoring all models at once as the batch engine does.
+    """
+    from main import X_vars, get_model_pipeline_object
+    from scoring import LogisticScorer, score_stacked
+
+    rows = []
+    for n_applications in sizes:
+        application_df, _, _ = make_membership_data(n_applications)
+
+        # NOTE: One model per scenario, each fitted on different outcomes of the same applicants
+        model_pipelines = []
+        for seed in range(n_scenarios):
+            default = np.random.default_rng(seed).integers(0, 2, n_applications)
+            model_pipeline = get_model_pipeline_object()
+            model_pipeline.fit(application_df.loc[:, X_vars], default)
+            model_pipelines.append(model_pipeline)
+        scorers = [LogisticScorer.from_pipeline(p) for p in model_pipelines]
+        coef = np.vstack([scorer.coef for scorer in scorers])
+        intercept = np.concatenate([scorer.intercept for scorer in scorers])
+
+        def score_pipeline():
+            return np.column_stack(
+                [
+                    p.predict_proba(application_df.loc[:, X_vars])[:, 1]
+                    for p in model_pipelines
+                ]
+            )
+
+        def score_scorer():
+            return np.column_stack(
+                [scorer.predict_default_proba(application_df) for scorer in scorers]
+            )
+
+        def score_batch():
+            return score_stacked(
+                scorers[0].get_features(application_df), coef, intercept
+            ).T
+
+        assert np.array_equal(score_pipeline(), score_scorer())
+        np.testing.assert_allclose(score_pipeline(), score_batch(), rtol=1e-12)
+        rows.append(
+            {
+                "n_applications": n_applications,
+                "n_scenarios": n_scenarios,
+                "pipeline_s": best_time(score_pipeline),
+                "scorer_s": best_time(score_scorer),
+                "score_stacked_s": best_time(score_batch),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def benchmark_training(sizes, n_models=13):
+    """
+    Compare fitting one sklearn pipeline per model with fitting all models with fit_many.
+    """
+    from logistic_solver import fit_many
+    from main import X_vars, get_model_pipeline_object
+    from scoring import LogisticScorer
+
+    rows = []
+    for n_applications in sizes:
+        application_df, _, _ = make_membership_data(n_applications)
+        X = application_df.loc[:, X_vars]
+
+        # NOTE: One training set per model, e.g. the observed outcomes of each scenario
+        rng = np.random.default_rng(0)
+        training_sets = []
+        for _ in range(n_models):
+            rows_mask = rng.uniform(size=n_applications) < 0.5
+            default = (
+                rng.uniform(size=n_applications)
+                < 1 / (1 + np.exp(3 - X.age.to_numpy()))
+            ).astype("int")
+            training_sets.append((X.loc[rows_mask], default[rows_mask]))
+
+        def fit_pipelines():
+            scorers = [
+                LogisticScorer.from_pipeline(get_model_pipeline_object().fit(X_, y_))
+                for X_, y_ in training_sets
+            ]
+            return np.vstack([scorer.coef for scorer in scorers]), np.concatenate(
+                [scorer.intercept for scorer in scorers]
+            )
+
+        def fit_batch():
+            return fit_many(
+                [X_.to_numpy() for X_, _ in training_sets],
+                [y_ for _, y_ in training_sets],
+            )
+
+        pipeline_coef, pipeline_intercept = fit_pipelines()
+        batch_coef, batch_intercept = fit_batch()
+        rows.append(
+            {
+                "n_applications": n_applications,
+                "n_models": n_models,
+                "pipeline_s": best_time(fit_pipelines),
+                "fit_many_s": best_time(fit_batch),
+                "max_coef_diff": max(
+                    np.abs(pipeline_coef - batch_coef).max(),
+                    np.abs(pipeline_intercept - batch_intercept).max(),
+                ),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def benchmark_query_strategies(sizes, research_acceptance_rate=0.15):
+    """
+    Compare the modAL query strategies with their native equivalents on precomputed scores.
+    """
+    import modAL.uncertainty
+
+    from main import X_vars, get_model_pipeline_object
+    from query_strategies import query_strategies
+
+    rows = []
+    for n_applications in sizes:
+        application_df, _, _ = make_membership_data(n_applications)
+        X = application_df.loc[:, X_vars]
+        default = np.random.default_rng(0).integers(0, 2, n_applications)
+        model_pipeline = get_model_pipeline_object().fit(X, default)
+        default_proba = model_pipeline.predict_proba(X)[:, 1]
+        n_instances = int(n_applications * research_acceptance_rate)
+
+        for name, query_strategy in query_strategies.items():
+            row = {"n_applications": n_applications, "strategy": name}
+            row["native_s"] = best_time(
+                lambda: query_strategy(default_proba, X.to_numpy(), n_instances)
+            )
+            if hasattr(modAL.uncertainty, name):
+                modal_strategy = getattr(modAL.uncertainty, name)
+                assert np.array_equal(
+                    modal_strategy(model_pipeline, X, n_instances=n_instances),
+                    query_strategy(default_proba, X.to_numpy(), n_instances),
+                )
+                row["modal_s"] = best_time(
+                    lambda: modal_strategy(model_pipeline, X, n_instances=n_instances)
+                )
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def benchmark_training_modes(applications_per_period, n_periods=10):
+    """
+    Fit time per period of each training mode, as outcomes of applications_per_period
+    applications are observed every period, and the log loss of its final model.
+
+    Also checks that each mode's model scores applications through LogisticScorer as its
+    pipeline does.
+    """
+    from main import X_vars, get_incremental_model
+    from scoring import LogisticScorer
+    from sklearn.metrics import log_loss
+    from training import training_modes
+
+    rows = []
+    for n_applications in applications_per_period:
+        rng = np.random.default_rng(0)
+        # NOTE: Skewed, unstandardized ages, roughly as in the synthetic data
+        age = rng.lognormal(0, 1, n_applications * (n_periods + 1))
+        default = rng.random(age.shape[0]) < 1 / (1 + np.exp(2 - age))
+        training_df = pd.DataFrame({"age": age, "default": default.astype("int")})
+        period_dfs = np.array_split(training_df, n_periods + 1)
+        test_df = period_dfs.pop()
+
+        for training_mode in training_modes:
+            model = get_incremental_model(training_mode)
+            fit_times = []
+            for period in range(n_periods):
+                start = time.perf_counter()
+                if training_mode == "full":
+                    model.fit(pd.concat(period_dfs[: period + 1], ignore_index=True))
+                else:
+                    model.partial_fit(period_dfs[period])
+                fit_times.append(time.perf_counter() - start)
+
+            default_proba = LogisticScorer.from_pipeline(
+                model.model_pipeline
+            ).predict_default_proba(test_df)
+            np.testing.assert_allclose(
+                default_proba,
+                model.model_pipeline.predict_proba(test_df.loc[:, X_vars])[:, 1],
+                rtol=1e-9,
+            )
+            rows.append(
+                {
+                    "applications_per_period": n_applications,
+                    "training_mode": training_mode,
+                    "first_fit_s": fit_times[0],
+                    "last_fit_s": fit_times[-1],
+                    "log_loss": log_loss(test_df.default, default_proba),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def profile_run(simulation_id, scenario, trace_memory: bool) -> pd.DataFrame:
+    """
+    Wall time and peak memory per top-level stage of a single run, including loading and export.
+    """
+    from main import historical_data_cache, raw_data_cache, result_sink, simulate
+    from main import write_results
+    from profiling import StageProfiler
+
+    raw_data_cache.clear()
+    historical_data_cache.clear()
+    profiler = StageProfiler(trace_memory=trace_memory, measure_frames=True)
+    with profiler.stage("load_raw_data"):
+        raw_data_cache.get(simulation_id)
+    ledgers = simulate(simulation_id, scenario, profiler=profiler)
+    with profiler.stage("export_results"):
+        write_results(*ledgers, scenario.id)
+        result_sink.complete_run(simulation_id, scenario.id)
+        result_sink.commit()
+    profile_df = profiler.to_frame()
+    return profile_df.loc[profile_df.parent.isna()].reset_index(drop=True)
+
+
+def benchmark_scaling(
+    applications_per_period,
+    periods,
+    scenario_id="u1",
+    base_applications_per_period=1_000,
+    base_periods=10,
+):
+    """
+    Wall time and peak memory of each stage of a run, as applications per period and
+    periods grow (each from the base setting).
+    """
+    # NOTE: Storage and results are configured by the environment when main is first imported
+    data_dir = tempfile.mkdtemp()
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_ROOT"] = data_dir
+    os.environ["RESULTS_URI"] = os.path.join(data_dir, "results")
+
+    from main import load_scenario_registry, result_sink
+    from storage import get_storage
+    from synthetic_data import generate_synthetic_data
+
+    settings = [
+        *[(n, base_periods) for n in applications_per_period],
+        *[(base_applications_per_period, n) for n in periods if n != base_periods],
+    ]
+    stage_dfs = []
+    try:
+        # NOTE: Seeded per setting, so that each setting is a simulation of its own
+        for seed, (n_applications, n_periods) in enumerate(settings):
+            raw_df = generate_synthetic_data(n_applications, seed, n_periods)
+            simulation_id = raw_df.simulation_id.iloc[0]
+            get_storage().write_synthetic_data(simulation_id, raw_df)
+            del raw_df
+            scenario = load_scenario_registry()[scenario_id]._replace(
+                n_periods=n_periods - 1
+            )
+
+            # NOTE: Timed without tracemalloc, which slows down allocations
+            time_df = profile_run(simulation_id, scenario, trace_memory=False)
+            memory_df = profile_run(simulation_id, scenario, trace_memory=True)
+            stage_df = (
+                time_df.assign(peak_memory_bytes=memory_df.peak_memory_bytes)
+                .groupby("stage", sort=False)
+                .agg(
+                    wall_time_s=("wall_time", "sum"),
+                    peak_memory_mib=("peak_memory_bytes", "max"),
+                )
+                .reset_index()
+            )
+            stage_df["peak_memory_mib"] /= 2**20
+            stage_df.loc[stage_df.shape[0]] = [
+                "total",
+                stage_df.wall_time_s.sum(),
+                stage_df.peak_memory_mib.max(),
+            ]
+            stage_dfs.append(
+                stage_df.assign(
+                    applications_per_period=n_applications, periods=n_periods
+                )
+            )
+            print(
+                f"{n_applications} applications x {n_periods} periods: "
+                f"{stage_df.wall_time_s.iloc[-1]:.2f}s"
+            )
+    finally:
+        result_sink.close()
+        shutil.rmtree(data_dir)
+
+    return pd.concat(stage_dfs, ignore_index=True)[
+        [
+            "applications_per_period",
+            "periods",
+            "stage",
+            "wall_time_s",
+            "peak_memory_mib",
+        ]
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "benchmark",
+        choices=[
+            "membership",
+            "scoring",
+            "training",
+            "training_modes",
+            "query_strategies",
+            "scaling",
+        ],
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[500, 5_000, 50_000, 500_000],
+        help="numbers of applications to benchmark with",
+    )
+    parser.add_argument(
+        "--applications-per-period",
+        type=int,
+        nargs="+",
+        default=[50, 1_000, 10_000, 100_000],
+        help="applications per period to benchmark scaling and training modes with "
+        "(at 10 periods)",
+    )
+    parser.add_argument(
+        "--periods",
+        type=int,
+        nargs="+",
+        default=[10, 30, 100],
+        help="periods to benchmark scaling with (at 1000 applications per period)",
+    )
+    parser.add_argument(
+        "--scenario", default="u1", help="scenario to benchmark scaling with"
+    )
+    args = parser.parse_args()
+
+    if args.benchmark == "membership":
+        result_df = benchmark_membership(args.sizes)
+    elif args.benchmark == "scoring":
+        result_df = benchmark_scoring(args.sizes)
+    elif args.benchmark == "training":
+        result_df = benchmark_training(args.sizes)
+    elif args.benchmark == "training_modes":
+        result_df = benchmark_training_modes(args.applications_per_period)
+    elif args.benchmark == "query_strategies":
+        result_df = benchmark_query_strategies(args.sizes)
+    elif args.benchmark == "scaling":
+        result_df = benchmark_scaling(
+            args.applications_per_period, args.periods, scenario_id=args.scenario
+        )
+
+    print(result_df.to_string(index=False))
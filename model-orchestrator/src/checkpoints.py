@@ -0,0 +1,72 @@
+import os
+import pickle
+import shutil
+
+
+class RunCheckpoints:
+    """
+    Snapshots of the state of simulation runs after a period, so that an interrupted run can
+    resume after its last checkpointed period instead of starting over.
+
+    Checkpoints are pickled into directory, one file per (simulation_id, scenario_id) run,
+    every interval periods. Each holds the attributes of the run it was taken from (e.g. the
+    scenario's fingerprint), and is only loaded by a run with the same attributes. Without a
+    directory, nothing is saved or loaded.
+    """
+
+    def __init__(self, directory: str = None, interval: int = 1):
+        if interval < 1:
+            raise ValueError("Checkpoint interval must be at least 1 period")
+        self.directory = directory
+        self.interval = interval
+
+    def _path(self, simulation_id: str, scenario_id: str) -> str:
+        return os.path.join(self.directory, scenario_id, f"{simulation_id}.pkl")
+
+    def is_due(self, n_periods: int) -> bool:
+        """
+        Whether to checkpoint a run after its first n_periods simulated periods.
+        """
+        return self.directory is not None and n_periods % self.interval == 0
+
+    def save(self, simulation_id: str, scenario_id: str, attributes: dict, state):
+        """
+        Replace the checkpoint of a run with state.
+        """
+        path = self._path(simulation_id, scenario_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # NOTE: Written to a temporary file first, so that an interruption never leaves a partial checkpoint
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((attributes, state), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, simulation_id: str, scenario_id: str, attributes: dict):
+        """
+        State of the latest checkpoint of a run with the given attributes, or None.
+        """
+        if self.directory is None:
+            return None
+        path = self._path(simulation_id, scenario_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            checkpoint_attributes, state = pickle.load(f)
+        return state if checkpoint_attributes == attributes else None
+
+    def delete(self, simulation_id: str, scenario_id: str):
+        """
+        Delete the checkpoint of a run, e.g. once its results are written.
+        """
+        if self.directory is None:
+            return
+        path = self._path(simulation_id, scenario_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        """
+        Delete all checkpoints, e.g. at the start of a new sweep.
+        """
+        if self.directory is not None and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from profiling import get_frame_bytes
+
+
+class Ledger:
+    """
+    Append-only table, stored as a sequence of DataFrame chunks (usually one per period).
+
+    Appending returns a new ledger which shares all existing chunks, so it costs time in
+    proportion to the appended rows rather than to the history. The full DataFrame is only
+    concatenated when requested, and is then cached.
+
+    Chunks and materialized frames are shared between ledgers and must be treated as read-only.
+
+    Chunks carry an integer application_code column (dense per simulation), which allows
+    membership tests against a boolean mask instead of comparing application_id strings.
+    """
+
+    __slots__ = ("_chunks", "_n_rows", "_n_bytes", "_frame", "_code_mask")
+
+    def __init__(self, chunks=()):
+        self._chunks = tuple(chunks)
+        self._n_rows = sum(chunk.shape[0] for chunk in self._chunks)
+        self._n_bytes = None
+        self._frame = None
+        self._code_mask = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Ledger":
+        return cls((df.reset_index(drop=True),))
+
+    def append(self, df: pd.DataFrame) -> "Ledger":
+        """
+        New ledger with the rows of df appended.
+        """
+        # NOTE: Empty chunks are dropped, so that they cannot alter the dtypes of the full frame
+        if df.shape[0] == 0 and self._chunks:
+            return self
+        df = df.reset_index(drop=True)
+        ledger = Ledger((*self._chunks, df))
+
+        # NOTE: Once memory usage or a mask has been requested, they are carried forward by
+        # only accounting for the new rows
+        if self._n_bytes is not None:
+            ledger._n_bytes = self._n_bytes + get_frame_bytes(df)
+        if self._code_mask is not None:
+            ledger._code_mask = self._code_mask.copy()
+            ledger._code_mask[df.application_code.to_numpy()] = True
+        return ledger
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def memory_usage(self) -> int:
+        """
+        Bytes held by the chunks, without the contents of object columns (e.g. strings).
+        """
+        if self._n_bytes is None:
+            self._n_bytes = get_frame_bytes(*self._chunks)
+        return self._n_bytes
+
+    def latest(self) -> pd.DataFrame:
+        """
+        Most recently appended chunk.
+        """
+        return self._chunks[-1]
+
+    def since(self, n_rows: int) -> pd.DataFrame:
+        """
+        Rows appended after the first n_rows rows, as a DataFrame.
+        """
+        offset = 0
+        for i, chunk in enumerate(self._chunks):
+            if offset + chunk.shape[0] > n_rows:
+                chunks = [chunk.iloc[n_rows - offset :], *self._chunks[i + 1 :]]
+                return pd.concat(chunks, ignore_index=True)
+            offset += chunk.shape[0]
+        return self._chunks[-1].iloc[0:0]
+
+    def select_codes(self, application_codes) -> pd.DataFrame:
+        """
+        Rows with the given application codes, in ledger order.
+
+        Searches the most recent chunks first and stops once all codes are found, so
+        looking up rows of the latest periods does not touch the history.
+        """
+        remaining_codes = np.unique(application_codes)
+        selected_chunks = []
+        for chunk in reversed(self._chunks):
+            if remaining_codes.size == 0:
+                break
+            chunk_codes = chunk.application_code.to_numpy()
+            is_selected = np.isin(chunk_codes, remaining_codes)
+            if is_selected.any():
+                selected_chunks.append(chunk.loc[is_selected])
+                remaining_codes = np.setdiff1d(
+                    remaining_codes, chunk_codes[is_selected], assume_unique=True
+                )
+        if not selected_chunks:
+            return self._chunks[-1].iloc[0:0]
+        return pd.concat(selected_chunks[::-1], ignore_index=True)
+
+    def get_code_mask(self, n_codes: int) -> np.ndarray:
+        """
+        Boolean array of length n_codes, True for each application_code in the ledger.
+        """
+        if self._code_mask is None:
+            code_mask = np.zeros(n_codes, dtype=bool)
+            for chunk in self._chunks:
+                code_mask[chunk.application_code.to_numpy()] = True
+            self._code_mask = code_mask
+        return self._code_mask
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        All rows as a single DataFrame.
+        """
+        if self._frame is None:
+            if len(self._chunks) == 1:
+                self._frame = self._chunks[0]
+            else:
+                self._frame = pd.concat(self._chunks, ignore_index=True)
+        return self._frame
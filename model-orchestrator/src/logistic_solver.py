@@ -0,0 +1,134 @@
+"""
+Batched solver for many small logistic regressions, e.g. the per-period models of several
+scenarios, periods or simulations.
+
+Fits the model of sklearn's LogisticRegression with its defaults: an L2 penalty of 1 / (2 C) on
+the coefficients and an unpenalized intercept. Instead of one lbfgs run per model, all models
+take Newton (IRLS) steps together, as batched NumPy operations on the training sets stacked
+into a (model, feature, row) array. With a handful of features, each step is a few passes over
+the data and a batch of tiny linear solves, so the per-model overhead of sklearn vanishes.
+"""
+
+import numpy as np
+from scipy.special import expit
+
+
+def get_objectives(z, y, weights, beta, penalty) -> np.ndarray:
+    """
+    Penalized negative log likelihood of each model at linear predictors z, scaled by C as
+    sklearn's.
+    """
+    log_loss = (weights * (np.logaddexp(0, z) - y * z)).sum(axis=1)
+    return log_loss + 0.5 * (penalty * np.square(beta)).sum(axis=1)
+
+
+def fit_stacked(X, y, weights, C: float, tol: float, max_iter: int) -> np.ndarray:
+    """
+    Coefficients (with the intercept last) of models stacked along the first axis, with X
+    as a (model, feature, row) array.
+
+    Rows with zero weight are padding. Steps are halved until they decrease the objective,
+    so that the iterations converge from zero coefficients for any data.
+    """
+    n_models, n_columns, _ = X.shape
+    penalty = np.full(n_columns, 1 / C)
+    penalty[-1] = 0
+    beta = np.zeros((n_models, n_columns))
+    z = np.zeros(y.shape)
+    objectives = get_objectives(z, y, weights, beta, penalty)
+
+    for _ in range(max_iter):
+        default_proba = expit(z)
+        gradient = np.einsum("mjn,mn->mj", X, weights * (default_proba - y))
+        gradient += penalty * beta
+        curvature = weights * default_proba * (1 - default_proba)
+        hessian = np.einsum("mjn,mkn,mn->mjk", X, X, curvature) + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient[:, :, np.newaxis])[:, :, 0]
+
+        # NOTE: Converged models take full steps, as their objectives are dominated by rounding
+        is_converged = np.abs(step).max(axis=1) < tol
+        if is_converged.all():
+            return beta - step
+
+        # NOTE: Backtracking line search, per model, on the Armijo condition (up to rounding)
+        step_sizes = np.ones(n_models)
+        decrease = (gradient * step).sum(axis=1)
+        rounding = 1e-12 * np.abs(objectives)
+        for _ in range(30):
+            new_beta = beta - step_sizes[:, np.newaxis] * step
+            new_z = np.einsum("mjn,mj->mn", X, new_beta)
+            new_objectives = get_objectives(new_z, y, weights, new_beta, penalty)
+            is_rejected = (
+                new_objectives > objectives - 1e-4 * step_sizes * decrease + rounding
+            ) & ~is_converged
+            if not is_rejected.any():
+                break
+            step_sizes[is_rejected] /= 2
+
+        beta, z, objectives = new_beta, new_z, new_objectives
+    return beta
+
+
+def fit_many(
+    X_list,
+    y_list,
+    C: float = 1.0,
+    tol: float = 1e-8,
+    max_iter: int = 100,
+    max_chunk_rows: int = 2**22,
+) -> tuple:
+    """
+    Fit a logistic regression to each pair of features X (rows x features) and binary
+    labels y.
+
+    Returns coefficients (model x feature) and intercepts (model), as coef_ and intercept_
+    of a LogisticRegression(C=C) fitted to each pair, up to the tolerance of its solver.
+
+    Models are stacked in order of size and fitted in chunks of at most max_chunk_rows
+    padded rows, so that models of very different sizes do not pad each other much.
+    """
+    if len(X_list) != len(y_list):
+        raise ValueError("X_list and y_list must have the same length")
+    X_list = [np.asarray(X, dtype="float64") for X in X_list]
+    X_list = [X.reshape(X.shape[0], -1) for X in X_list]
+    y_list = [np.asarray(y, dtype="float64").ravel() for y in y_list]
+    n_features = X_list[0].shape[1] if X_list else 0
+    for X, y in zip(X_list, y_list):
+        if X.shape[1] != n_features or X.shape[0] != y.shape[0]:
+            raise ValueError("Inconsistent shapes of X and y")
+        # NOTE: As sklearn, which cannot fit a binary model to a single class either
+        if not (np.any(y == 0) and np.any(y == 1)) or np.any((y != 0) & (y != 1)):
+            raise ValueError("Each y must contain both classes, 0 and 1")
+
+    coef = np.empty((len(X_list), n_features))
+    intercept = np.empty(len(X_list))
+    sizes = np.array([X.shape[0] for X in X_list], dtype="int64")
+    order = np.argsort(sizes, kind="stable")
+
+    start = 0
+    while start < order.shape[0]:
+        # NOTE: Models are sorted by size, so the last model of a chunk sets its padded size
+        end = start + 1
+        while (
+            end < order.shape[0]
+            and (end - start + 1) * sizes[order[end]] <= max_chunk_rows
+        ):
+            end += 1
+        chunk = order[start:end]
+        n_rows = sizes[chunk].max()
+
+        X = np.zeros((chunk.shape[0], n_features + 1, n_rows))
+        y = np.zeros((chunk.shape[0], n_rows))
+        weights = np.zeros((chunk.shape[0], n_rows))
+        for i, model in enumerate(chunk):
+            X[i, :n_features, : sizes[model]] = X_list[model].T
+            X[i, n_features, : sizes[model]] = 1
+            y[i, : sizes[model]] = y_list[model]
+            weights[i, : sizes[model]] = 1
+
+        beta = fit_stacked(X, y, weights, C, tol, max_iter)
+        coef[chunk] = beta[:, :n_features]
+        intercept[chunk] = beta[:, n_features]
+        start = end
+
+    return coef, intercept
@@ -1,29 +1,72 @@
 # Must be loaded first, else 'free()' error
-from dagster import ModeDefinition, PresetDefinition, execute_pipeline, pipeline, solid
+from dagster import (
+    DynamicOutput,
+    DynamicOutputDefinition,
+    EventMetadataEntry,
+    ExperimentalWarning,
+    Field,
+    ModeDefinition,
+    Output,
+    execute_pipeline,
+    pipeline,
+    resource,
+    solid,
+)
 
+import argparse
 import os
+import sys
+import time
+import traceback
+import warnings
+from functools import lru_cache
 from typing import Union
 
-import boto3
-import modAL
 import numpy as np
 import pandas as pd
-import sklearn
 from modAL.models import ActiveLearner
 from modAL.uncertainty import uncertainty_sampling
-from sklearn import linear_model
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
-from yaml import safe_load
 
-bucket_name = os.getenv("S3_BUCKET_NAME")
+from checkpoints import RunCheckpoints
+from ledger import Ledger
+from logistic_solver import fit_many
+from profiling import (
+    StageProfiler,
+    get_frame_bytes,
+    get_profile_report,
+    get_profiler,
+    use_profiler,
+)
+from raw_data_cache import RawDataCache
+from result_sink import ResultSink
+from scenarios import Scenario, load_scenario_registry
+from schema import normalize
+from scoring import LogisticScorer, score_stacked
+from storage import get_simulation_id, get_storage
+from sweep import (
+    SweepTask,
+    TaskResult,
+    get_sweep_tasks,
+    get_task_seed,
+    run_batch_sweep,
+    run_sweep,
+    run_task,
+)
+from training import IncrementalModel, get_classifier
+
+# NOTE: Run profiles are attached to solid outputs as metadata, which is experimental in this Dagster version
+warnings.filterwarnings(
+    "ignore", message='"metadata_entries"', category=ExperimentalWarning
+)
 
 # NOTE: counterfactual_default is defined as default outcome had applicant been granted loan
-simulation_indices = ["simulation_id", "application_id"]
+# NOTE: application_code is a dense integer id per simulation, used for joins and filters in memory
+simulation_indices = ["simulation_id", "application_id", "application_code"]
 simulation_metadata = [
     "counterfactual_default",
-    "scenario_id",
     "idiosyncratic_individual_risk",
     "total_default_risk",
     "age_var",
@@ -43,46 +86,210 @@ full_portfolio_col_set = [
 
 full_outcome_col_set = [*simulation_indices, "default"]
 
+# NOTE: Columns of the synthetic data used by simulations, e.g. not total_default_risk_log_odds
+synthetic_data_col_set = [
+    "simulation_id",
+    "application_id",
+    "default",
+    "idiosyncratic_individual_risk",
+    "total_default_risk",
+    "age_var",
+    "application_date",
+    *X_vars,
+]
 
-def get_scenario_df():
+
+@resource
+def scenario_registry(init_context):
     """
     Set of scenarios which will be modeled, specified in YAML.
     """
-    with open("scenarios.yml", "r") as f:
-        scenarios = safe_load(f)
-        scenario_df = pd.DataFrame(scenarios["scenarios"])
-    return scenario_df
+    return load_scenario_registry()
 
 
-def get_raw_data(simulation_id, scenario_id):
+def load_raw_data(simulation_id):
     """
-    Raw dataset drawn from synthetic data based on simulation_id and labeled with scenario_id.
+    Load synthetic data for simulation_id from storage.
     """
-    raw_df = pd.read_parquet(
-        f"s3://{bucket_name}/synthetic_data/{simulation_id}.parquet"
-    )
-    raw_df = raw_df.loc[raw_df.simulation_id == simulation_id].copy()
-    raw_df.reset_index(inplace=True, drop=True)
-    raw_df["counterfactual_default"] = raw_df["default"]
-    raw_df["scenario_id"] = scenario_id
+    profiler = get_profiler()
+    with profiler.stage("load_raw_data") as record:
+        raw_df = get_storage().read_synthetic_data(
+            simulation_id, columns=synthetic_data_col_set
+        )
+        record["rows_in"] = raw_df.shape[0]
+        # NOTE: Rows are only filtered if needed, so that memory-mapped columns stay shared
+        is_simulation = raw_df.simulation_id == simulation_id
+        if not is_simulation.all():
+            raw_df = raw_df.loc[is_simulation].reset_index(drop=True)
+        raw_df["counterfactual_default"] = raw_df["default"]
+        # NOTE: Codes equal row positions, so raw data can be filtered with code masks directly
+        raw_df["application_code"] = np.arange(raw_df.shape[0], dtype="int32")
+        raw_df = normalize(raw_df)
+        record["rows_out"] = raw_df.shape[0]
+        if profiler.measure_frames:
+            record["frame_bytes"] = get_frame_bytes(raw_df)
     return raw_df
 
 
+@lru_cache(maxsize=None)
+def get_synthetic_data_versions() -> dict:
+    """
+    Versions (e.g. ETags) of the synthetic data of each simulation, listed once per process.
+    """
+    return {
+        get_simulation_id(key): version
+        for key, version in get_storage().list_parts("synthetic_data").items()
+    }
+
+
+# NOTE: Synthetic data is shared by all scenarios, so each simulation is only fetched once per process
+raw_data_cache = RawDataCache(
+    load_raw_data,
+    max_bytes=int(os.getenv("RAW_DATA_CACHE_MAX_BYTES", 2 * 1024**3)),
+    local_dir=os.getenv("RAW_DATA_CACHE_DIR"),
+    get_version=lambda simulation_id: get_synthetic_data_versions().get(simulation_id),
+)
+
+
+# NOTE: Results of all runs in this process are buffered and written to datasets partitioned by scenario
+run_result_tables = ["applications", "portfolios", "outcomes", "profiles"]
+result_tables = [*run_result_tables, "scenarios"]
+result_sink = ResultSink(
+    os.getenv("RESULTS_URI", get_storage().root_uri),
+    row_group_size=int(os.getenv("RESULTS_ROW_GROUP_SIZE", 2**17)),
+    file_format=os.getenv("RESULTS_FORMAT", "parquet"),
+    commit_interval=float(os.getenv("RESULTS_COMMIT_INTERVAL", 300)),
+)
+
+# NOTE: Frame memory costs a pass over the ledgers' columns per stage, so it is only recorded on request
+profile_frames = os.getenv("PROFILE_FRAME_BYTES", "0") == "1"
+
+# NOTE: Disabled unless CHECKPOINT_DIR is set
+run_checkpoints = RunCheckpoints(
+    os.getenv("CHECKPOINT_DIR"), interval=int(os.getenv("CHECKPOINT_INTERVAL", 1))
+)
+
+
+def get_run_attributes(simulation_id, scenario: Scenario) -> dict:
+    """
+    Inputs of a run recorded with its results, which invalidate them when they change.
+    """
+    return {
+        "scenario_fingerprint": scenario.fingerprint(),
+        "synthetic_data_version": get_synthetic_data_versions().get(simulation_id),
+    }
+
+
+def get_completed_runs() -> set:
+    """
+    (simulation_id, scenario_id) pairs committed by previous sweeps, with their current
+    scenario settings and synthetic data.
+
+    Results of all other runs (e.g. of runs interrupted before their commit, or of changed
+    scenarios) are deleted, so that these runs can be run again.
+    """
+    registry = load_scenario_registry()
+
+    def is_valid_run(run) -> bool:
+        if run.scenario_id not in registry.ids:
+            return False
+        run_attributes = get_run_attributes(
+            run.simulation_id, registry[run.scenario_id]
+        )
+        return all(
+            getattr(run, attribute, None) == value
+            for attribute, value in run_attributes.items()
+        )
+
+    run_df = result_sink.resume(run_result_tables, is_valid_run)
+    return set(zip(run_df.simulation_id, run_df.scenario_id))
+
+
+def get_raw_data(simulation_id):
+    """
+    Raw dataset drawn from synthetic data based on simulation_id.
+    """
+    # NOTE: The cached frame is shared by all scenarios, so callers must not modify it
+    return raw_data_cache.get(simulation_id)
+
+
+def get_n_applications(simulation_id):
+    """
+    Number of applications in a simulation, i.e. the number of distinct application codes.
+    """
+    return raw_data_cache.get(simulation_id).shape[0]
+
+
+def get_first_application_date(simulation_id, scenario: Scenario) -> int:
+    """
+    Application date of the historical period of a run.
+    """
+    if scenario.first_application_date is not None:
+        return scenario.first_application_date
+    return int(raw_data_cache.get(simulation_id).application_date.min())
+
+
+def get_application_dates(simulation_id, scenario: Scenario) -> list:
+    """
+    Application dates simulated in a run: the scenario's n_periods dates of the synthetic
+    data which follow its historical period.
+    """
+    first_application_date = get_first_application_date(simulation_id, scenario)
+    application_dates = np.unique(raw_data_cache.get(simulation_id).application_date)
+    return [
+        int(application_date)
+        for application_date in application_dates
+        if application_date > first_application_date
+    ][: scenario.n_periods]
+
+
+def limit_applications(df: pd.DataFrame, applications_per_period) -> pd.DataFrame:
+    """
+    First applications_per_period rows of one period's applications (all if None).
+
+    Synthetic applications are drawn independently, so the first rows are a random sample.
+    """
+    if applications_per_period is None:
+        return df
+    return df.iloc[:applications_per_period]
+
+
+def load_historical_data(key):
+    """
+    Data of the historical period for a (simulation_id, application_date) key, marked as funded
+    through the business portfolio.
+    """
+    simulation_id, application_date = key
+    df = raw_data_cache.get(simulation_id)
+
+    df_hist = (
+        df.loc[df.application_date == application_date].copy().reset_index(drop=True)
+    )
+    df_hist["portfolio"] = "business"
+    df_hist["credit_granted"] = True
+    df_hist["funding_probability"] = 1
+    return normalize(df_hist)
+
+
+# NOTE: Historical data only depends on the historical period, so it is shared by scenarios.
+# It holds a single period per simulation, so its budget is separate and much smaller.
+historical_data_cache = RawDataCache(
+    load_historical_data,
+    max_bytes=int(os.getenv("HISTORICAL_DATA_CACHE_MAX_BYTES", 256 * 1024**2)),
+)
+
+
 def get_historical_data(
-    simulation_id, scenario_id
+    simulation_id, scenario: Scenario
 ) -> list[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Fetch historical data. First period data is assumed to be available at start of simulation.
     """
-    df = get_raw_data(simulation_id, scenario_id)
-    df["portfolio"] = "business"
-    df["credit_granted"] = True
-    df["funding_probability"] = 1
-
-    df_hist = (
-        df.loc[df.application_date == df.application_date.min()]
-        .copy()
-        .reset_index(drop=True)
+    df_hist = limit_applications(
+        historical_data_cache.get(
+            (simulation_id, get_first_application_date(simulation_id, scenario))
+        ),
+        scenario.applications_per_period,
     )
 
     hist_application_df = (
@@ -107,37 +314,6 @@ def get_historical_data(
     }
 
 
-@solid(config_schema={"simulation_id": str, "scenario_id": str})
-def get_historical_application_data(context):
-    """
-    Fetch first period application data.
-    """
-    simulation_id = context.solid_config["simulation_id"]
-    scenario_id = context.solid_config["scenario_id"]
-
-    return get_historical_data(simulation_id, scenario_id)["applications"]
-
-
-@solid(config_schema={"simulation_id": str, "scenario_id": str})
-def get_historical_portfolio_data(context):
-    """Fetch first period portfolio (granted loans) data."""
-    simulation_id = context.solid_config["simulation_id"]
-    scenario_id = context.solid_config["scenario_id"]
-
-    return get_historical_data(simulation_id, scenario_id)["portfolio"]
-
-
-@solid(config_schema={"simulation_id": str, "scenario_id": str})
-def get_historical_outcome_data(context):
-    """
-    Fetch first period outcome data.
-    """
-    simulation_id = context.solid_config["simulation_id"]
-    scenario_id = context.solid_config["scenario_id"]
-
-    return get_historical_data(simulation_id, scenario_id)["outcomes"]
-
-
 def get_feature_pipeline():
     """
     Fetch feature pipeline.
@@ -155,47 +331,36 @@ def get_feature_pipeline():
     return column_trans
 
 
-def get_model_pipeline_object():
+def get_model_pipeline_object(training_mode="full"):
     """
     Fetch model pipeline artifact.
     """
     column_trans = get_feature_pipeline()
-    model_pipeline = make_pipeline(column_trans, linear_model.LogisticRegression())
-    return model_pipeline
+    if training_mode == "full":
+        return make_pipeline(column_trans, get_classifier(training_mode))
+    # NOTE: Incremental modes scale features as at their first fit, see IncrementalModel
+    return make_pipeline(column_trans, StandardScaler(), get_classifier(training_mode))
 
 
-@solid(config_schema={"scenario_id": str})
-def get_model_pipeline(context) -> sklearn.pipeline.Pipeline:
+def get_incremental_model(training_mode="full") -> IncrementalModel:
     """
-    Fetch model pipeline.
+    Fetch untrained model pipeline, to be trained according to training_mode.
     """
-    scenario_id = context.solid_config["scenario_id"]
-    scenario_df = get_scenario_df()
+    model_pipeline = get_model_pipeline_object(training_mode)
 
-    column_trans = get_feature_pipeline()
+    return IncrementalModel(model_pipeline, training_mode, X_vars, "default")
 
-    model_pipeline = get_model_pipeline_object()
 
-    return model_pipeline
-
-
-@solid(config_schema={"scenario_id": str})
-def get_active_learning_pipeline(context):
+def align_on_application_code(df: pd.DataFrame, application_codes) -> pd.DataFrame:
     """
-    Fetch active learning pipeline.
+    Non-index columns of df, reordered to match application_codes (missing rows as NaN).
     """
-    scenario_id = context.solid_config["scenario_id"]
-    scenario_df = get_scenario_df()
-
-    active_learning_spec = scenario_df.loc[
-        scenario_df.id == scenario_id, "active_learning_spec"
-    ].iloc[0]
-    model_pipeline = get_model_pipeline_object()
-
-    if active_learning_spec == "random":
-        return None
-    elif active_learning_spec != "random":
-        return getattr(modAL.uncertainty, active_learning_spec)
+    return (
+        df.drop(columns=simulation_indices)
+        .set_index(df.application_code.to_numpy())
+        .reindex(application_codes)
+        .reset_index(drop=True)
+    )
 
 
 def prepare_training_data(
@@ -203,20 +368,28 @@ def prepare_training_data(
 ):
     """
     Join datasets to create training data file.
-    """
-    training_df = pd.merge(
-        application_df, portfolio_df, on=["application_id", "simulation_id"], how="left"
-    )
 
-    training_df = pd.merge(
-        training_df,
-        outcome_df,
-        on=["application_id", "simulation_id"],
-        how="left",
-    )
+    Equivalent to left joins on application_id, but matches integer application codes instead.
+    """
+    profiler = get_profiler()
+    with profiler.stage("prepare_training_data") as record:
+        record["rows_in"] = application_df.shape[0]
+        application_codes = application_df.application_code.to_numpy()
+
+        training_df = pd.concat(
+            [
+                application_df.reset_index(drop=True),
+                align_on_application_code(portfolio_df, application_codes),
+                align_on_application_code(outcome_df, application_codes),
+            ],
+            axis=1,
+        )
+        record["rows_out"] = training_df.shape[0]
+        if profiler.measure_frames:
+            record["frame_bytes"] = get_frame_bytes(training_df)
 
     assert (
-        training_df.application_id.duplicated().sum() == 0
+        training_df.application_code.duplicated().sum() == 0
     ), training_df.application_date.max()
     assert (
         training_df.shape[0] == application_df.shape[0]
@@ -228,91 +401,120 @@ def prepare_training_data(
     return training_df.reset_index(drop=True)
 
 
-@solid
-def train_model(
-    context,
-    application_df: pd.DataFrame,
-    portfolio_df: pd.DataFrame,
-    outcome_df,
-    model_pipeline: sklearn.pipeline.Pipeline,
-) -> sklearn.pipeline.Pipeline:
+# NOTE: The steps of a simulation period, called in turn by simulate()
+
+
+def update_model(
+    application_ledger: Ledger,
+    portfolio_ledger: Ledger,
+    outcome_ledger: Ledger,
+    model_pipeline: IncrementalModel,
+) -> IncrementalModel:
     """
-    training_data: data collected from previous loans granted, as pd.DataFrame
-    model: machine learning model (pipeline) which can be applied to training data
+    Train model_pipeline on the data collected from previous loans granted.
     """
-    training_df = prepare_training_data(application_df, portfolio_df, outcome_df)
+    if model_pipeline.training_mode != "full":
+        # NOTE: Outcomes are only ever appended, so rows beyond those seen are new observations
+        new_outcome_df = outcome_ledger.since(model_pipeline.n_observed)
+        new_application_df = application_ledger.select_codes(
+            new_outcome_df.application_code
+        )
+        new_training_df = pd.concat(
+            [
+                new_outcome_df,
+                align_on_application_code(
+                    new_application_df, new_outcome_df.application_code.to_numpy()
+                ),
+            ],
+            axis=1,
+        )
+        with get_profiler().stage("fit_model") as record:
+            record["rows_in"] = new_training_df.shape[0]
+            return model_pipeline.partial_fit(new_training_df)
+
+    training_df = prepare_training_data(
+        application_ledger.to_frame(),
+        portfolio_ledger.to_frame(),
+        outcome_ledger.to_frame(),
+    )
 
     # NOTE: Currently all cases without observed default are dropped for ML model!
 
     training_df = training_df.loc[training_df.default.notnull()].copy()
 
-    model_pipeline.fit(training_df.loc[:, X_vars], training_df["default"].astype("int"))
-
-    return model_pipeline
+    with get_profiler().stage("fit_model") as record:
+        record["rows_in"] = training_df.shape[0]
+        return model_pipeline.fit(training_df)
 
 
-@solid(
-    config_schema={"application_date": int, "simulation_id": str, "scenario_id": str}
-)
-def get_applications(context, application_df) -> pd.DataFrame:
+def add_applications(
+    application_ledger: Ledger,
+    simulation_id,
+    application_date,
+    applications_per_period=None,
+) -> Ledger:
     """
-    gets applications for new loans from customers
+    Append the applications of application_date to application_ledger.
     """
-
-    application_date = context.solid_config["application_date"]
-    simulation_id = context.solid_config["simulation_id"]
-    scenario_id = context.solid_config["scenario_id"]
-
-    raw_application_df = get_raw_data(simulation_id, scenario_id)
-    new_application_df = raw_application_df.loc[
-        raw_application_df.application_date == application_date
-    ].copy()
+    raw_application_df = get_raw_data(simulation_id)
+    new_application_df = limit_applications(
+        raw_application_df.loc[raw_application_df.application_date == application_date],
+        applications_per_period,
+    ).copy()
     new_application_df.reset_index(inplace=True, drop=True)
-    return application_df.append(
-        new_application_df[full_application_col_set]
-    ).reset_index(drop=True)
+    return application_ledger.append(new_application_df[full_application_col_set])
 
 
-@solid(config_schema={"application_date": int, "scenario_id": str})
-def choose_business_portfolio(
-    context,
-    application_df: pd.DataFrame,
-    portfolio_df: pd.DataFrame,
-    model_pipeline: sklearn.pipeline.Pipeline,
+def score_current_applications(
+    application_ledger: Ledger, model_pipeline: IncrementalModel, application_date
 ) -> pd.DataFrame:
     """
-    Decide whom to grant loans to (for profit)
-
-    applications: pd.DataFrame
-    model: machine learning model (pipeline) which can be applied to applications, based on training data
+    Applications of application_date, with their estimated default probability.
     """
-
-    application_date = context.solid_config["application_date"]
-    scenario_id = context.solid_config["scenario_id"]
-    scenario_df = get_scenario_df()
-
+    # NOTE: Applications of the current application_date are appended last
+    latest_application_df = application_ledger.latest()
     current_application_df = (
-        application_df.loc[application_df.application_date == application_date]
+        latest_application_df.loc[
+            latest_application_df.application_date == application_date
+        ]
         .copy()
         .reset_index(drop=True)
     )
 
     # NOTE: No applications this application_date!
     if current_application_df.shape[0] == 0:
-        return portfolio_df
+        return current_application_df.assign(est_default_prob=np.nan)
 
-    current_application_df["est_default_prob"] = pd.DataFrame(
-        model_pipeline.predict_proba(current_application_df.loc[:, X_vars])
-    ).loc[:, 1]
+    # NOTE: Same expression as the pipeline's predict_proba, without its per-call overhead
+    scorer = LogisticScorer.from_pipeline(model_pipeline.model_pipeline)
+    current_application_df["est_default_prob"] = scorer.predict_default_proba(
+        current_application_df
+    )
 
     assert (
         current_application_df.est_default_prob.isna().sum() == 0
     ), "Some estimated default probabilities NaN"
 
+    return current_application_df
+
+
+def select_business_portfolio(
+    scored_application_df: pd.DataFrame, portfolio_ledger: Ledger
+) -> Ledger:
+    """
+    Append the loans granted for profit to portfolio_ledger.
+    """
+
+    current_application_df = scored_application_df
+
+    # NOTE: No applications this application_date!
+    if current_application_df.shape[0] == 0:
+        return portfolio_ledger
+
     # NOTE: All applicants below 10% risk threshold accepted
     business_portfolio_df = (
         current_application_df.loc[current_application_df["est_default_prob"] <= 0.10]
-        .copy()[["application_id", "simulation_id"]]
+        .copy()[simulation_indices]
         .reset_index(drop=True)
     )
 
@@ -320,280 +522,825 @@ def choose_business_portfolio(
     business_portfolio_df["funding_probability"] = 1
     business_portfolio_df["credit_granted"] = True
 
-    return portfolio_df.append(business_portfolio_df[full_portfolio_col_set])
+    return portfolio_ledger.append(
+        normalize(business_portfolio_df[full_portfolio_col_set])
+    )
 
 
-@solid(config_schema={"application_date": int, "scenario_id": str})
-def choose_research_portfolio(
-    context,
-    application_df: pd.DataFrame,
-    portfolio_df: pd.DataFrame,
-    outcome_df: pd.DataFrame,
-    model_pipeline: sklearn.pipeline.Pipeline,
+def select_research_portfolio(
+    scored_application_df: pd.DataFrame,
+    portfolio_ledger: Ledger,
     active_learning_pipeline,
-) -> pd.DataFrame:
+    scenario: Scenario,
+    simulation_id,
+    application_date,
+) -> Ledger:
     """
-    Decide whom to grant loans to (for research / profit in subsequent rounds)
-
-    business_portfolio: {"application_id", "credit_granted"} as pd.DataFrame
+    Append the loans granted for research (profit in subsequent rounds) to portfolio_ledger.
     """
+    scenario_id = scenario.id
+    active_learning_spec = scenario.active_learning_spec
+    research_acceptance_rate = scenario.research_acceptance_rate
 
-    application_date = context.solid_config["application_date"]
-    scenario_id = context.solid_config["scenario_id"]
-    scenario_df = get_scenario_df()
-
-    active_learning_spec = scenario_df.loc[
-        scenario_df.id == scenario_id, "active_learning_spec"
-    ].iloc[0]
-
-    research_acceptance_rate = scenario_df.loc[
-        scenario_df.id == scenario_id, "research_acceptance_rate"
-    ].iloc[0]
-
-    current_applications = application_df[
-        application_df.application_date == application_date
-    ].copy()
+    current_applications = scored_application_df
 
+    funded_mask = portfolio_ledger.get_code_mask(get_n_applications(simulation_id))
     unfunded_applications = current_applications[
-        ~application_df.application_id.isin(portfolio_df.application_id.tolist())
+        ~funded_mask[current_applications.application_code.to_numpy()]
     ].copy()
 
     # NOTE: No applications this application_date!
     if unfunded_applications.shape[0] == 0:
-        return portfolio_df
+        return portfolio_ledger
 
     # NOTE: If research_acceptance_rate is no-active-learning, no research loans are made
     if scenario_id == "no-active-learning":
-        return portfolio_df
+        return portfolio_ledger
 
     n_research_loans = int(current_applications.shape[0] * research_acceptance_rate)
 
     if active_learning_spec == "random":
+        # NOTE: Seeded per task and period, so that results do not depend on execution order
         research_portfolio_df = unfunded_applications.sample(
-            min(n_research_loans, unfunded_applications.shape[0])
+            min(n_research_loans, unfunded_applications.shape[0]),
+            random_state=get_task_seed(simulation_id, scenario_id, application_date),
         )
     else:
-
-        active_learning_df = prepare_training_data(
-            unfunded_applications,
-            portfolio_df.loc[
-                portfolio_df.application_id.isin(
-                    unfunded_applications.application_id.tolist()
-                )
-            ],
-            outcome_df.loc[
-                outcome_df.application_id.isin(
-                    unfunded_applications.application_id.tolist()
-                )
-            ],
-        )
+        # NOTE: Unfunded applications have neither loans nor outcomes yet, so joining them with
+        # the portfolio and outcome history would only add empty columns
+        active_learning_df = unfunded_applications.reset_index(drop=True)
 
         if active_learning_df.shape[0] <= n_research_loans:
             research_portfolio_df = active_learning_df.copy()
         else:
-            research_portfolio_df = active_learning_df.copy()
-            research_loan_index = active_learning_pipeline(
-                classifier=model_pipeline,
-                X=active_learning_df.loc[:, X_vars],
-                n_instances=n_research_loans,
-            )
-            research_portfolio_df = active_learning_df.loc[research_loan_index].copy()
+            # NOTE: Query strategies reuse the scores of score_applications
+            with get_profiler().stage("query_strategy") as record:
+                record["rows_in"] = active_learning_df.shape[0]
+                research_loan_positions = active_learning_pipeline(
+                    active_learning_df.est_default_prob.to_numpy(),
+                    active_learning_df.loc[:, X_vars].to_numpy(),
+                    n_research_loans,
+                )
+                record["rows_out"] = len(research_loan_positions)
+            research_portfolio_df = active_learning_df.iloc[
+                research_loan_positions
+            ].copy()
 
     research_portfolio_df = (
-        research_portfolio_df[["application_id", "simulation_id"]]
-        .reset_index(drop=True)
-        .copy()
+        research_portfolio_df[simulation_indices].reset_index(drop=True).copy()
     )
 
     research_portfolio_df["portfolio"] = "research"
     research_portfolio_df["credit_granted"] = True
     research_portfolio_df["funding_probability"] = np.nan
 
-    return portfolio_df.append(research_portfolio_df[full_portfolio_col_set])
+    return portfolio_ledger.append(
+        normalize(research_portfolio_df[full_portfolio_col_set])
+    )
 
 
-@solid(
-    config_schema={"application_date": int, "simulation_id": str, "scenario_id": str}
-)
-def observe_outcomes(
-    context, portfolio_df: pd.DataFrame, outcome_df: pd.DataFrame
-) -> pd.DataFrame:
+def add_outcomes(
+    portfolio_ledger: Ledger, outcome_ledger: Ledger, simulation_id
+) -> Ledger:
     """
-    Observe outcomes to granted credit.
+    Append the outcomes of newly granted loans to outcome_ledger.
     """
-    application_date = context.solid_config["application_date"]
-    simulation_id = context.solid_config["simulation_id"]
-    scenario_id = context.solid_config["scenario_id"]
+    raw_data = get_raw_data(simulation_id)
 
-    raw_data = get_raw_data(simulation_id, scenario_id)
-    new_loan_outcomes = raw_data.loc[
-        (~raw_data.application_id.isin(outcome_df.application_id.tolist()))
-        & (raw_data.application_id.isin(portfolio_df.application_id.tolist()))
-    ].copy()
+    # NOTE: Raw data rows are ordered by application_code
+    funded_mask = portfolio_ledger.get_code_mask(raw_data.shape[0])
+    observed_mask = outcome_ledger.get_code_mask(raw_data.shape[0])
+    new_loan_outcomes = raw_data.loc[funded_mask & ~observed_mask].copy()
 
-    return outcome_df.append(new_loan_outcomes[full_outcome_col_set])
+    return outcome_ledger.append(new_loan_outcomes[full_outcome_col_set])
 
 
-@solid(config_schema={"simulation_id": str, "scenario_id": str})
-def export_results(
-    context,
-    application_df: pd.DataFrame,
-    portfolio_df: pd.DataFrame,
-    outcome_df: pd.DataFrame,
+def write_results(
+    application_ledger: Ledger,
+    portfolio_ledger: Ledger,
+    outcome_ledger: Ledger,
+    scenario_id,
 ):
     """
-    Export simulation results to s3 for later analysis.
+    Write simulation results to the result datasets for later analysis.
     """
-    simulation_id = context.solid_config["simulation_id"]
-    scenario_id = context.solid_config["scenario_id"]
+    result_dfs = {
+        "applications": application_ledger.to_frame(),
+        "portfolios": portfolio_ledger.to_frame(),
+        "outcomes": outcome_ledger.to_frame(),
+    }
 
-    application_df.to_parquet(
-        f"s3://{bucket_name}/applications/{scenario_id}/{simulation_id}.parquet"
-    )
-    portfolio_df.to_parquet(
-        f"s3://{bucket_name}/portfolios/{scenario_id}/{simulation_id}.parquet"
-    )
-    outcome_df.to_parquet(
-        f"s3://{bucket_name}/outcomes/{scenario_id}/{simulation_id}.parquet"
-    )
-    get_scenario_df().to_parquet(
-        f"s3://{bucket_name}/scenarios/{scenario_id}/{simulation_id}.parquet"
-    )
+    # NOTE: application_code is only meaningful within this process, so it is not exported
+    for table, result_df in result_dfs.items():
+        result_sink.write(
+            table,
+            result_df.drop(columns="application_code").assign(scenario_id=scenario_id),
+        )
 
 
-def var_if_gr_1(i, var):
+def simulate(simulation_id, scenario: Scenario, application_dates=None, profiler=None):
     """
-    Helper function for associating dagster tasks with config variables
+    Run the periods of a simulation for a scenario, resuming from its latest checkpoint if any.
+    application_dates overrides the scenario's horizon (see get_application_dates).
     """
-    if i > 1:
-        return f"{var}_{i}"
-    else:
-        return var
+    profiler = profiler or get_profiler()
+    with use_profiler(profiler):
+        if application_dates is None:
+            application_dates = get_application_dates(simulation_id, scenario)
+        checkpoint_attributes = {
+            **get_run_attributes(simulation_id, scenario),
+            "application_dates": list(application_dates),
+        }
+
+        checkpoint = run_checkpoints.load(
+            simulation_id, scenario.id, checkpoint_attributes
+        )
+        if checkpoint is None:
+            with profiler.stage("get_historical_data") as record:
+                historical_data = get_historical_data(simulation_id, scenario)
+                application_ledger = Ledger.from_frame(historical_data["applications"])
+                portfolio_ledger = Ledger.from_frame(historical_data["portfolio"])
+                outcome_ledger = Ledger.from_frame(historical_data["outcomes"])
+                model_pipeline = get_incremental_model(scenario.training_mode)
+                record["rows_out"] = len(application_ledger)
+            n_periods_done = 0
+        else:
+            (
+                application_ledger,
+                portfolio_ledger,
+                outcome_ledger,
+                model_pipeline,
+                n_periods_done,
+            ) = checkpoint
+
+        # NOTE: rows_in and rows_out count the rows a stage consumes and adds; frame_bytes is the
+        # memory of the ledger (or frame) it produces, only measured if the profiler asks for it
+        for n_periods, application_date in enumerate(
+            application_dates[n_periods_done:], start=n_periods_done + 1
+        ):
+            with profiler.stage("train_model", application_date) as record:
+                model_pipeline = update_model(
+                    application_ledger, portfolio_ledger, outcome_ledger, model_pipeline
+                )
+                record["rows_in"] = model_pipeline.n_observed
+            with profiler.stage("get_applications", application_date) as record:
+                n_applications = len(application_ledger)
+                application_ledger = add_applications(
+                    application_ledger,
+                    simulation_id,
+                    application_date,
+                    scenario.applications_per_period,
+                )
+                record["rows_out"] = len(application_ledger) - n_applications
+                if profiler.measure_frames:
+                    record["frame_bytes"] = application_ledger.memory_usage()
+            with profiler.stage("score_applications", application_date) as record:
+                scored_application_df = score_current_applications(
+                    application_ledger, model_pipeline, application_date
+                )
+                record["rows_in"] = record["rows_out"] = scored_application_df.shape[0]
+                if profiler.measure_frames:
+                    record["frame_bytes"] = get_frame_bytes(scored_application_df)
+            with profiler.stage(
+                "choose_business_portfolio", application_date
+            ) as record:
+                n_loans = len(portfolio_ledger)
+                portfolio_ledger = select_business_portfolio(
+                    scored_application_df, portfolio_ledger
+                )
+                record["rows_in"] = scored_application_df.shape[0]
+                record["rows_out"] = len(portfolio_ledger) - n_loans
+                if profiler.measure_frames:
+                    record["frame_bytes"] = portfolio_ledger.memory_usage()
+            with profiler.stage(
+                "choose_research_portfolio", application_date
+            ) as record:
+                n_loans = len(portfolio_ledger)
+                portfolio_ledger = select_research_portfolio(
+                    scored_application_df,
+                    portfolio_ledger,
+                    scenario.query_strategy,
+                    scenario,
+                    simulation_id,
+                    application_date,
+                )
+                record["rows_in"] = scored_application_df.shape[0]
+                record["rows_out"] = len(portfolio_ledger) - n_loans
+                if profiler.measure_frames:
+                    record["frame_bytes"] = portfolio_ledger.memory_usage()
+            with profiler.stage("observe_outcomes", application_date) as record:
+                n_outcomes = len(outcome_ledger)
+                outcome_ledger = add_outcomes(
+                    portfolio_ledger, outcome_ledger, simulation_id
+                )
+                record["rows_out"] = len(outcome_ledger) - n_outcomes
+                if profiler.measure_frames:
+                    record["frame_bytes"] = outcome_ledger.memory_usage()
+
+            # NOTE: No checkpoint after the last period, as the run's results are written next
+            if n_periods < len(application_dates) and run_checkpoints.is_due(n_periods):
+                with profiler.stage("save_checkpoint", application_date):
+                    run_checkpoints.save(
+                        simulation_id,
+                        scenario.id,
+                        checkpoint_attributes,
+                        (
+                            application_ledger,
+                            portfolio_ledger,
+                            outcome_ledger,
+                            model_pipeline,
+                            n_periods,
+                        ),
+                    )
+
+    return application_ledger, portfolio_ledger, outcome_ledger
+
+
+def profile_simulation(
+    simulation_id, scenario: Scenario, application_dates=None
+) -> StageProfiler:
+    """
+    Carry out a simulation for a scenario and write its results and profile.
+    """
+    profiler = StageProfiler(measure_frames=profile_frames)
+    ledgers = simulate(simulation_id, scenario, application_dates, profiler=profiler)
+    try:
+        with profiler.stage("write_results") as record:
+            write_results(*ledgers, scenario.id)
+            record["rows_out"] = sum(len(ledger) for ledger in ledgers)
+
+        # NOTE: Profiles are buffered into the profiles dataset like results, rather than one small file per run
+        result_sink.write(
+            "profiles",
+            profiler.to_frame().assign(
+                simulation_id=simulation_id, scenario_id=scenario.id
+            ),
+        )
+        result_sink.complete_run(
+            simulation_id, scenario.id, **get_run_attributes(simulation_id, scenario)
+        )
+    except Exception:
+        # NOTE: Else a retry of the run in this process would write its rows twice
+        result_sink.discard_run(simulation_id, scenario.id)
+        raise
+    run_checkpoints.delete(simulation_id, scenario.id)
+    return profiler
 
 
 def run_simulation(simulation_id, scenario_id):
     """
-    Helper function for carrying out simulation for a given scenario.
+    Carry out a simulation for a given scenario, in process.
     """
-    solids_dict = {
-        var_if_gr_1(i + 1, var): {
-            "config": {
-                "application_date": range(2021, 2031)[i],
-                "scenario_id": scenario_id,
-            }
-        }
-        for i in range(9)
-        for var in [
-            "choose_business_portfolio",
-            "choose_research_portfolio",
-        ]
-    }
+    profile_simulation(simulation_id, load_scenario_registry()[scenario_id])
 
-    solids_dict.update(
-        {
-            "get_model_pipeline": {"config": {"scenario_id": scenario_id}},
-            "get_active_learning_pipeline": {"config": {"scenario_id": scenario_id}},
-        }
-    )
 
-    solids_dict.update(
-        {
-            var_if_gr_1(i + 1, var): {
-                "config": {
-                    "application_date": range(2021, 2031)[i],
-                    "simulation_id": simulation_id,
-                    "scenario_id": scenario_id,
-                }
-            }
-            for i in range(9)
-            for var in [
-                "get_applications",
-                "observe_outcomes",
-            ]
-        }
-    )
+# NOTE: The batch engine runs the scenarios of a simulation together, as simulate() would run each
 
-    solids_dict.update(
-        {
-            var: {
-                "config": {"simulation_id": simulation_id, "scenario_id": scenario_id}
-            }
-            for var in [
-                "get_historical_application_data",
-                "get_historical_portfolio_data",
-                "get_historical_outcome_data",
-                "export_results",
-            ]
-        }
+
+def get_batch_key(scenario: Scenario) -> tuple:
+    """
+    Settings which scenarios must share to be simulated in one batch: horizon, population and
+    training mode. Batches differ only in research_acceptance_rate and active_learning_spec.
+    """
+    return (
+        scenario.first_application_date,
+        scenario.n_periods,
+        scenario.applications_per_period,
+        scenario.training_mode,
     )
 
-    run_config = {"solids": solids_dict}
 
-    @pipeline(
-        mode_defs=[ModeDefinition("unittest")],
-        preset_defs=[
-            PresetDefinition(
-                "unittest",
-                run_config=run_config,
-                mode="unittest",
+def fit_batch_models(X, default, application_codes, observed) -> tuple:
+    """
+    Coefficients (scenario x feature) and intercepts of the models of a batch, each fitted on
+    the observed outcomes of its scenario; scenarios with the same observations share a fit.
+    """
+    fit_keys = [np.packbits(observed_codes).tobytes() for observed_codes in observed]
+    fit_indices = {}
+    for i, fit_key in enumerate(fit_keys):
+        fit_indices.setdefault(fit_key, i)
+
+    with get_profiler().stage("fit_model") as record:
+        training_codes = [
+            application_codes[observed[i, application_codes]]
+            for i in fit_indices.values()
+        ]
+        coef, intercept = fit_many(
+            [X[codes] for codes in training_codes],
+            [default[codes] for codes in training_codes],
+        )
+        record["rows_in"] = sum(codes.shape[0] for codes in training_codes)
+
+    # NOTE: Rows of the fitted models, per scenario
+    model_positions = {fit_key: j for j, fit_key in enumerate(fit_indices)}
+    positions = [model_positions[fit_key] for fit_key in fit_keys]
+    return coef[positions], intercept[positions]
+
+
+def select_batch_research_codes(
+    scenario: Scenario,
+    unfunded_codes: np.ndarray,
+    unfunded_scores: np.ndarray,
+    X,
+    n_current_applications: int,
+    simulation_id,
+    application_date,
+) -> np.ndarray:
+    """
+    Application codes of the research loans of one scenario of a batch, selected as
+    select_research_portfolio does.
+    """
+    if unfunded_codes.shape[0] == 0 or scenario.id == "no-active-learning":
+        return unfunded_codes[:0]
+
+    n_research_loans = int(n_current_applications * scenario.research_acceptance_rate)
+    if scenario.active_learning_spec == "random":
+        # NOTE: Sampled as DataFrame.sample samples the unfunded applications, with the same seed
+        return (
+            pd.Series(unfunded_codes)
+            .sample(
+                min(n_research_loans, unfunded_codes.shape[0]),
+                random_state=get_task_seed(
+                    simulation_id, scenario.id, application_date
+                ),
             )
-        ],
-    )
-    def active_learning_experiment_credit():
-        """
-        Active learning 'main' function.
-        """
-        application_df = get_historical_application_data()
-        portfolio_df = get_historical_portfolio_data()
-        outcome_df = get_historical_outcome_data()
-        model_pipeline = get_model_pipeline()
-        active_learning_pipeline = get_active_learning_pipeline()
-
-        for t in range(9):
-
-            trained_model = train_model(
-                application_df,
-                portfolio_df,
-                outcome_df,
-                model_pipeline,
+            .to_numpy()
+        )
+
+    if unfunded_codes.shape[0] <= n_research_loans:
+        return unfunded_codes
+    with get_profiler().stage("query_strategy") as record:
+        record["rows_in"] = unfunded_codes.shape[0]
+        research_loan_positions = scenario.query_strategy(
+            unfunded_scores, X[unfunded_codes], n_research_loans
+        )
+        record["rows_out"] = len(research_loan_positions)
+    return unfunded_codes[research_loan_positions]
+
+
+def simulate_batch(
+    simulation_id, scenarios, application_dates=None, profiler=None
+) -> dict:
+    """
+    Run a simulation for several full-mode scenarios sharing their get_batch_key() at once.
+    Returns {scenario_id: (application_ledger, portfolio_ledger, outcome_ledger)}.
+    """
+    scenarios = list(scenarios)
+    scenario = scenarios[0]
+    if any(get_batch_key(other) != get_batch_key(scenario) for other in scenarios):
+        raise ValueError("Scenarios of a batch must share their horizon and population")
+    if scenario.training_mode != "full":
+        raise ValueError("Batches only support the full training mode")
+
+    profiler = profiler or get_profiler()
+    with use_profiler(profiler):
+        if application_dates is None:
+            application_dates = get_application_dates(simulation_id, scenario)
+
+        raw_df = raw_data_cache.get(simulation_id)
+        X = raw_df.loc[:, X_vars].to_numpy(dtype="float64")
+        default = raw_df["default"].to_numpy().astype("int")
+        n_scenarios = len(scenarios)
+
+        with profiler.stage("get_historical_data") as record:
+            historical_codes = get_historical_data(simulation_id, scenario)[
+                "applications"
+            ].application_code.to_numpy()
+            funded = np.zeros((n_scenarios, raw_df.shape[0]), dtype=bool)
+            funded[:, historical_codes] = True
+            observed = funded.copy()
+            record["rows_out"] = historical_codes.shape[0]
+
+        # NOTE: Codes in order of arrival (applications) and of funding or observation (per scenario)
+        application_code_chunks = [historical_codes]
+        portfolio_code_chunks = [[historical_codes] for _ in scenarios]
+        research_code_chunks = [[] for _ in scenarios]
+        outcome_code_chunks = [[historical_codes] for _ in scenarios]
+
+        for application_date in application_dates:
+            with profiler.stage("train_model", application_date) as record:
+                application_codes = np.concatenate(application_code_chunks)
+                coef, intercept = fit_batch_models(
+                    X, default, application_codes, observed
+                )
+                record["rows_in"] = int(observed.sum())
+            with profiler.stage("get_applications", application_date) as record:
+                current_codes = limit_applications(
+                    raw_df.loc[raw_df.application_date == application_date],
+                    scenario.applications_per_period,
+                ).application_code.to_numpy()
+                application_code_chunks.append(current_codes)
+                record["rows_out"] = current_codes.shape[0]
+
+            # NOTE: No applications this application_date!
+            if current_codes.shape[0] == 0:
+                continue
+
+            with profiler.stage("score_applications", application_date) as record:
+                # NOTE: Shape (scenario, application)
+                scores = score_stacked(X[current_codes], coef, intercept)
+                assert not np.isnan(
+                    scores
+                ).any(), "Some estimated default probabilities NaN"
+                record["rows_in"] = current_codes.shape[0]
+                record["rows_out"] = scores.size
+            with profiler.stage(
+                "choose_business_portfolio", application_date
+            ) as record:
+                # NOTE: All applicants below 10% risk threshold accepted
+                is_business = scores <= 0.10
+                funded[:, current_codes] |= is_business
+                for i in range(n_scenarios):
+                    portfolio_code_chunks[i].append(current_codes[is_business[i]])
+                record["rows_in"] = scores.size
+                record["rows_out"] = int(is_business.sum())
+            with profiler.stage(
+                "choose_research_portfolio", application_date
+            ) as record:
+                is_unfunded = ~funded[:, current_codes]
+                n_research_loans = 0
+                for i, batch_scenario in enumerate(scenarios):
+                    research_codes = select_batch_research_codes(
+                        batch_scenario,
+                        current_codes[is_unfunded[i]],
+                        scores[i, is_unfunded[i]],
+                        X,
+                        current_codes.shape[0],
+                        simulation_id,
+                        application_date,
+                    )
+                    funded[i, research_codes] = True
+                    research_code_chunks[i].append(research_codes)
+                    n_research_loans += research_codes.shape[0]
+                record["rows_in"] = int(is_unfunded.sum())
+                record["rows_out"] = n_research_loans
+            with profiler.stage("observe_outcomes", application_date) as record:
+                # NOTE: Outcomes of newly funded loans, in order of application code as in add_outcomes
+                is_new_outcome = funded[:, current_codes] & ~observed[:, current_codes]
+                observed[:, current_codes] |= is_new_outcome
+                for i in range(n_scenarios):
+                    outcome_code_chunks[i].append(
+                        np.sort(current_codes[is_new_outcome[i]])
+                    )
+                record["rows_out"] = int(is_new_outcome.sum())
+
+        with profiler.stage("build_results") as record:
+            ledgers = get_batch_ledgers(
+                raw_df,
+                scenarios,
+                np.concatenate(application_code_chunks),
+                portfolio_code_chunks,
+                research_code_chunks,
+                outcome_code_chunks,
+            )
+            record["rows_out"] = sum(
+                len(ledger)
+                for batch_ledgers in ledgers.values()
+                for ledger in batch_ledgers
             )
 
-            application_df = get_applications(application_df)
+    return ledgers
 
-            portfolio_df = choose_business_portfolio(
-                application_df, portfolio_df, trained_model
+
+def get_batch_ledgers(
+    raw_df: pd.DataFrame,
+    scenarios,
+    application_codes,
+    portfolio_code_chunks,
+    research_code_chunks,
+    outcome_code_chunks,
+) -> dict:
+    """
+    Ledgers of each scenario of a batch, with the rows and columns simulate() would produce.
+
+    Portfolio chunks alternate business and research loans per period, after the historical
+    loans, as they are appended by simulate().
+    """
+    application_df = raw_df.loc[application_codes, full_application_col_set]
+    application_ledger = Ledger.from_frame(application_df)
+
+    ledgers = {}
+    for i, scenario in enumerate(scenarios):
+        portfolio_codes = [portfolio_code_chunks[i][0]]
+        portfolios = [np.full(portfolio_code_chunks[i][0].shape[0], "business")]
+        for business_codes, research_codes in zip(
+            portfolio_code_chunks[i][1:], research_code_chunks[i]
+        ):
+            portfolio_codes.extend([business_codes, research_codes])
+            portfolios.extend(
+                [
+                    np.full(business_codes.shape[0], "business"),
+                    np.full(research_codes.shape[0], "research"),
+                ]
+            )
+        portfolio_codes = np.concatenate(portfolio_codes)
+        portfolio = np.concatenate(portfolios).astype(object)
+
+        portfolio_df = normalize(
+            raw_df.loc[portfolio_codes, simulation_indices].assign(
+                portfolio=portfolio,
+                credit_granted=True,
+                funding_probability=np.where(portfolio == "business", 1, np.nan),
             )
+        )
+        outcome_df = raw_df.loc[
+            np.concatenate(outcome_code_chunks[i]), full_outcome_col_set
+        ]
+        ledgers[scenario.id] = (
+            application_ledger,
+            Ledger.from_frame(portfolio_df),
+            Ledger.from_frame(outcome_df),
+        )
+    return ledgers
+
 
-            portfolio_df = choose_research_portfolio(
-                application_df,
-                portfolio_df,
-                outcome_df,
-                trained_model,
-                active_learning_pipeline,
+def profile_simulation_batch(simulation_id, scenarios, application_dates=None):
+    """
+    Carry out a simulation for a batch of scenarios and write their results and profiles.
+    """
+    profiler = StageProfiler(measure_frames=profile_frames)
+    ledgers = simulate_batch(
+        simulation_id, scenarios, application_dates, profiler=profiler
+    )
+    try:
+        with profiler.stage("write_results") as record:
+            for scenario in scenarios:
+                write_results(*ledgers[scenario.id], scenario.id)
+            record["rows_out"] = sum(
+                len(ledger)
+                for batch_ledgers in ledgers.values()
+                for ledger in batch_ledgers
+            )
+
+        # NOTE: Stages are shared by the batch, so each run's profile carries an equal share of their time
+        profile_df = profiler.to_frame()
+        profile_df[["wall_time", "cpu_time"]] /= len(scenarios)
+        for scenario in scenarios:
+            result_sink.write(
+                "profiles",
+                profile_df.assign(simulation_id=simulation_id, scenario_id=scenario.id),
+            )
+            result_sink.complete_run(
+                simulation_id,
+                scenario.id,
+                **get_run_attributes(simulation_id, scenario),
+            )
+    except Exception:
+        for scenario in scenarios:
+            result_sink.discard_run(simulation_id, scenario.id)
+        raise
+    return profiler
+
+
+def run_simulation_batch(simulation_id, scenario_ids) -> dict:
+    """
+    Carry out a simulation for several scenarios, in process, batching those which can be.
+
+    Scenarios which do not train in full mode are run one at a time. A failed run or batch
+    does not stop the others; returns the error (traceback) of each failed scenario.
+    """
+    registry = load_scenario_registry()
+    batches = {}
+    errors = {}
+    for scenario_id in scenario_ids:
+        scenario = registry[scenario_id]
+        if scenario.training_mode == "full":
+            batches.setdefault(get_batch_key(scenario), []).append(scenario)
+            continue
+        try:
+            profile_simulation(simulation_id, scenario)
+        except Exception:
+            errors[scenario_id] = traceback.format_exc()
+    for scenarios in batches.values():
+        try:
+            profile_simulation_batch(simulation_id, scenarios)
+        except Exception:
+            error = traceback.format_exc()
+            errors.update((scenario.id, error) for scenario in scenarios)
+    return errors
+
+
+def get_profile_metadata(profiler: StageProfiler) -> list:
+    """
+    Dagster metadata entries of a run's profile: totals, wall time per top-level stage and a
+    table of all stages.
+    """
+    profile_df = profiler.to_frame()
+    report_df = get_profile_report(profile_df)
+    top_level_df = report_df.loc[report_df.parent.isna()]
+    return [
+        EventMetadataEntry.float(float(top_level_df.wall_time.sum()), "wall_time"),
+        EventMetadataEntry.float(float(top_level_df.cpu_time.sum()), "cpu_time"),
+        EventMetadataEntry.float(
+            float(profile_df.max_rss_bytes.max() / 2**20), "max_rss_mib"
+        ),
+        *[
+            EventMetadataEntry.float(float(row.wall_time), f"wall_time_{row.stage}")
+            for row in top_level_df.itertuples()
+        ],
+        EventMetadataEntry.md(
+            report_df.fillna({"parent": ""}).to_markdown(index=False, floatfmt=".4f"),
+            "stages",
+        ),
+    ]
+
+
+@solid(
+    config_schema={"runs": [{"simulation_id": str, "scenario_id": str}]},
+    output_defs=[DynamicOutputDefinition()],
+)
+def get_sweep_runs(context):
+    """
+    Fan out over the (simulation_id, scenario_id) runs of a sweep.
+    """
+    for i, run in enumerate(context.solid_config["runs"]):
+        yield DynamicOutput(
+            SweepTask(run["simulation_id"], run["scenario_id"]), mapping_key=f"run_{i}"
+        )
+
+
+@solid(
+    config_schema={
+        "application_dates": Field(
+            [int],
+            is_required=False,
+            description="Simulated application dates, instead of each scenario's horizon",
+        )
+    },
+    required_resource_keys={"scenarios"},
+)
+def simulate_run(context, task) -> TaskResult:
+    """
+    Run all periods of a simulation for a scenario, and export the results.
+    """
+    scenario = context.resources.scenarios[task.scenario_id]
+    profilers = []
+
+    def run_fn(simulation_id, scenario_id):
+        profilers.append(
+            profile_simulation(
+                simulation_id, scenario, context.solid_config.get("application_dates")
             )
+        )
+
+    # NOTE: Failures are captured per run, so that they do not stop the rest of the sweep
+    result = run_task(run_fn, task)
+    if not result.succeeded:
+        context.log.error(result.error)
+    yield Output(
+        result,
+        metadata_entries=get_profile_metadata(profilers[0]) if profilers else [],
+    )
+
+
+@solid
+def collect_results(context, results) -> list:
+    """
+    Results of all runs, in sweep order.
+    """
+    return results
+
+
+@pipeline(
+    mode_defs=[
+        ModeDefinition("unittest", resource_defs={"scenarios": scenario_registry})
+    ],
+)
+def active_learning_experiment_credit():
+    """
+    Active learning 'main' function, with a solid per (simulation_id, scenario_id) run.
+    """
+    collect_results(get_sweep_runs().map(simulate_run).collect())
+
 
-            outcome_df = observe_outcomes(portfolio_df, outcome_df)
+def get_sweep_run_config(tasks) -> dict:
+    """
+    Run config of active_learning_experiment_credit for a sweep over tasks.
+    """
+    return {
+        "solids": {
+            "get_sweep_runs": {
+                "config": {
+                    "runs": [
+                        {"simulation_id": simulation_id, "scenario_id": scenario_id}
+                        for simulation_id, scenario_id in tasks
+                    ]
+                }
+            },
+        }
+    }
 
-        export_results(application_df, portfolio_df, outcome_df)
 
-    execute_pipeline(active_learning_experiment_credit, run_config=run_config)
+def run_sweep_pipeline(tasks) -> list:
+    """
+    Carry out a sweep as a single execution of active_learning_experiment_credit.
+    """
+    # NOTE: Definition and config validation happen once per sweep, rather than once per run
+    result = execute_pipeline(
+        active_learning_experiment_credit,
+        run_config=get_sweep_run_config(tasks),
+        mode="unittest",
+    )
+    if not tasks:
+        return []
+    return result.result_for_solid("collect_results").output_value()
 
 
 if __name__ == "__main__":
-    s3 = boto3.resource("s3")
-    s3_alec = s3.Bucket(bucket_name)
+    parser = argparse.ArgumentParser(description="Run the ALEC simulation grid.")
+    parser.add_argument(
+        "--engine",
+        choices=["fast", "batch", "dagster"],
+        default="fast",
+        help="fast: run simulations in process (default); batch: run all scenarios of a "
+        "simulation together in process; dagster: run the sweep as a single execution of the "
+        "active_learning_experiment_credit pipeline",
+    )
+    parser.add_argument(
+        "--order",
+        choices=["simulation", "scenario"],
+        default="simulation",
+        help="simulation: run all scenarios of one simulation before moving on (default); "
+        "scenario: run all simulations of one scenario before moving on",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes to distribute simulation runs over",
+    )
+    parser.add_argument(
+        "--resume",
+        "--append",
+        action="store_true",
+        dest="resume",
+        help="keep results of previous sweeps and only run pairs of simulation and scenario "
+        "without valid results, e.g. after an interrupted sweep or adding simulations or "
+        "scenarios; runs also resume from their checkpoints",
+    )
+    args = parser.parse_args()
+    if args.engine == "dagster" and args.workers > 1:
+        parser.error("--workers is not supported by the dagster engine")
 
-    # Empty bucket of alec objects
-    for folder in ["applications", "portfolios", "outcomes", "scenarios"]:
-        s3_alec.objects.filter(Prefix=f"{folder}/").delete()
-        s3_alec.objects.filter(Prefix=f"{folder}/").delete()
+    if args.resume:
+        completed_runs = get_completed_runs()
+        print(f"Resuming sweep, keeping the results of {len(completed_runs)} runs")
+    else:
+        # Empty previous results
+        result_sink.clear(result_tables)
+        run_checkpoints.clear()
+        completed_runs = set()
+
+    simulation_ids = get_storage().list_simulation_ids()
 
-    simulation_ids = [f.key for f in s3_alec.objects.filter(Prefix="synthetic_data/")]
-    simulation_ids = [
-        simulation_id.split("/")[1].split(".")[0] for simulation_id in simulation_ids
+    # NOTE: Written once per sweep, rather than once per run
+    result_sink.write_table("scenarios", load_scenario_registry().to_frame())
+
+    scenario_ids = load_scenario_registry().ids
+    tasks = [
+        task
+        for task in get_sweep_tasks(simulation_ids, scenario_ids, order=args.order)
+        if (task.simulation_id, task.scenario_id) not in completed_runs
     ]
 
-    scenario_df = get_scenario_df()
-    for scenario_id in scenario_df.id.tolist():
-        for simulation_id in simulation_ids:
-            run_simulation(simulation_id, scenario_id)
+    # NOTE: Simulation-major chunks keep each simulation's scenarios on one worker, sharing its data cache
+    chunksize = len(scenario_ids) if args.order == "simulation" else 1
+
+    # NOTE: Workers load synthetic data on demand; a single process downloads ahead of the runs,
+    # in task order, skipping simulations whose runs all completed in a previous sweep
+    if args.workers <= 1:
+        get_storage().prefetch(
+            list(dict.fromkeys(task.simulation_id for task in tasks))
+        )
+
+    sweep_start = time.perf_counter()
+    failed_results = []
+    if args.engine == "dagster":
+        results = run_sweep_pipeline(tasks)
+    elif args.engine == "batch":
+        results = run_batch_sweep(run_simulation_batch, tasks, n_workers=args.workers)
+    else:
+        results = run_sweep(
+            run_simulation, tasks, n_workers=args.workers, chunksize=chunksize
+        )
+
+    for result in results:
+        status = "done" if result.succeeded else "FAILED"
+        print(
+            f"Scenario: {result.scenario_id}, Simulation: {result.simulation_id}, "
+            f"{status} in {result.wall_time:.1f}s"
+        )
+        if not result.succeeded:
+            failed_results.append(result)
+            print(result.error)
+
+    print(
+        f"Finished {len(tasks)} runs in {time.perf_counter() - sweep_start:.1f}s "
+        f"with {args.workers} worker(s), {len(failed_results)} failed"
+    )
+    if args.workers <= 1:
+        print(f"Raw data cache: {raw_data_cache.stats()}")
+    result_sink.close()
+
+    if failed_results:
+        sys.exit(1)
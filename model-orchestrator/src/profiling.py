@@ -0,0 +1,228 @@
+"""
+Instrumentation of the stages of simulation runs, and a report over the recorded profiles.
+
+Runs record a profile (one row per stage and period) into the "profiles" result dataset.
+Aggregate the profiles of a sweep with `python profiling.py report`, run from this directory.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+profile_columns = [
+    "stage",
+    "parent",
+    "application_date",
+    "wall_time",
+    "cpu_time",
+    "rows_in",
+    "rows_out",
+    "frame_bytes",
+    "max_rss_bytes",
+    "peak_memory_bytes",
+]
+
+# NOTE: ru_maxrss is reported in bytes on macOS, but in kilobytes on Linux
+rss_unit = 1 if sys.platform == "darwin" else 1024
+
+
+def get_max_rss() -> int:
+    """
+    Peak resident set size of this process so far, in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_unit
+
+
+class NullProfiler:
+    """
+    Profiler which records nothing, used when a run is not profiled.
+    """
+
+    measure_frames = False
+
+    @contextmanager
+    def stage(self, name: str, application_date=None):
+        yield {}
+
+
+class StageProfiler:
+    """
+    Wall time, CPU time, rows and memory of each stage of a simulation run.
+
+    Stages may be nested, e.g. model fitting within train_model, in which case the enclosing
+    stage is recorded as the parent and the period is inherited from it. Code inside a stage
+    can fill in rows_in and rows_out of the record yielded by stage(), and with measure_frames
+    also frame_bytes (memory of the DataFrames it produced), which takes a pass over their
+    columns.
+
+    Peak memory is measured as the process's peak resident set size at the end of each stage
+    and, with trace_memory, with tracemalloc as the highest traced memory during the stage
+    above the traced memory at its start. Tracing slows down allocations, so wall times of a
+    run with trace_memory are only comparable with each other.
+    """
+
+    def __init__(self, trace_memory: bool = False, measure_frames: bool = False):
+        self.trace_memory = trace_memory
+        self.measure_frames = measure_frames
+        self.records = []
+        self._stack = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, application_date=None):
+        parent = self._stack[-1] if self._stack else None
+        if application_date is None and parent is not None:
+            application_date = parent["application_date"]
+        record = {
+            "stage": name,
+            "parent": None if parent is None else parent["stage"],
+            "application_date": application_date,
+            "rows_in": np.nan,
+            "rows_out": np.nan,
+            "frame_bytes": np.nan,
+            "peak_memory_bytes": np.nan,
+        }
+        self._stack.append(record)
+
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - start
+            record["cpu_time"] = time.process_time() - start_cpu
+            record["max_rss_bytes"] = get_max_rss()
+            if self.trace_memory:
+                record["peak_memory_bytes"] = (
+                    tracemalloc.get_traced_memory()[1] - start_memory
+                )
+            self._stack.pop()
+            self.records.append(record)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        One row per stage and period, in order of completion.
+        """
+        # NOTE: Fixed dtypes, so that profiles of all runs share the schema of the profiles dataset
+        return pd.DataFrame(self.records, columns=profile_columns).astype(
+            {
+                "stage": "str",
+                "parent": "object",
+                "application_date": "Int64",
+                **{column: "float64" for column in profile_columns[3:]},
+            }
+        )
+
+
+active_profiler = NullProfiler()
+
+
+def get_profiler():
+    """
+    Profiler of the run in progress in this process (a NullProfiler if none).
+    """
+    return active_profiler
+
+
+@contextmanager
+def use_profiler(profiler):
+    """
+    Make profiler the active profiler within the block, e.g. for the duration of a run.
+    """
+    global active_profiler
+    previous_profiler = active_profiler
+    active_profiler = profiler
+    try:
+        yield profiler
+    finally:
+        active_profiler = previous_profiler
+
+
+def get_frame_bytes(*dfs) -> int:
+    """
+    Memory of DataFrames, without the contents of object columns (e.g. strings).
+    """
+    return int(sum(df.memory_usage(index=True, deep=False).sum() for df in dfs))
+
+
+def get_profile_report(profile_df: pd.DataFrame, by=()) -> pd.DataFrame:
+    """
+    Time, rows and memory per stage (and groups of by), hottest stages first.
+
+    Nested stages are listed per parent, e.g. fit_model within train_model and query_strategy
+    within choose_research_portfolio. share is the fraction of the wall time of all top-level
+    stages spent in a stage, so a nested stage's share is also part of its parent's.
+    """
+    by = list(by)
+    top_level_wall_time = profile_df.loc[profile_df.parent.isna(), "wall_time"].sum()
+    report_df = (
+        profile_df.groupby([*by, "stage", "parent"], dropna=False, observed=True)
+        .agg(
+            calls=("wall_time", "size"),
+            wall_time=("wall_time", "sum"),
+            wall_time_per_call=("wall_time", "mean"),
+            cpu_time=("cpu_time", "sum"),
+            rows_in=("rows_in", lambda rows: rows.sum(min_count=1)),
+            rows_out=("rows_out", lambda rows: rows.sum(min_count=1)),
+            max_frame_mib=("frame_bytes", "max"),
+            max_rss_mib=("max_rss_bytes", "max"),
+        )
+        .reset_index()
+        .astype({"rows_in": "Int64", "rows_out": "Int64"})
+    )
+    report_df["share"] = report_df.wall_time / top_level_wall_time
+    report_df["max_frame_mib"] /= 2**20
+    report_df["max_rss_mib"] /= 2**20
+    return report_df.sort_values("wall_time", ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser(
+        "report", help="aggregate the profiles of all runs and list the hottest stages"
+    )
+    report_parser.add_argument(
+        "results_uri",
+        nargs="?",
+        help="s3:// URI or local directory of the results, default as for main.py",
+    )
+    report_parser.add_argument(
+        "--by",
+        nargs="*",
+        default=[],
+        choices=["scenario_id", "simulation_id", "application_date"],
+        help="also break the report down by these columns",
+    )
+    report_parser.add_argument(
+        "--top", type=int, default=20, help="number of stages to list"
+    )
+    args = parser.parse_args()
+
+    from storage import get_storage, open_storage
+
+    results_uri = args.results_uri or os.getenv("RESULTS_URI", get_storage().root_uri)
+    profile_df = open_storage(results_uri).read_dataset("profiles")
+    n_runs = profile_df.groupby(["simulation_id", "scenario_id"], observed=True).ngroups
+    print(
+        f"{n_runs} runs, "
+        f"{profile_df.loc[profile_df.parent.isna(), 'wall_time'].sum():.1f}s in stages"
+    )
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(
+            get_profile_report(profile_df, by=args.by)
+            .head(args.top)
+            .fillna({"parent": ""})
+            .to_string(index=False, float_format="{:.3f}".format)
+        )
@@ -0,0 +1,104 @@
+"""
+Active learning query strategies for binary default models.
+
+Strategies select research loans from already computed default probabilities, rather than
+calling the classifier again. They share the signature
+
+    strategy(default_proba, X, n_instances) -> positions of the selected rows
+
+and reproduce the selections of the modAL strategies of the same name.
+"""
+
+import numpy as np
+from scipy.special import entr
+
+
+def top_k(values: np.ndarray, n_instances: int) -> np.ndarray:
+    """
+    Positions of the n_instances largest values (in no particular order), in linear time.
+    """
+    if n_instances <= 0:
+        return np.array([], dtype="int64")
+    if n_instances >= values.shape[0]:
+        return np.arange(values.shape[0])
+    # NOTE: Same partition as modAL's multi_argmax, so that ties are broken identically
+    return np.argpartition(-values, n_instances - 1)[:n_instances]
+
+
+def get_uncertainty(default_proba: np.ndarray) -> np.ndarray:
+    """
+    1 - probability of the most likely outcome.
+    """
+    return 1 - np.maximum(1 - default_proba, default_proba)
+
+
+def get_margin(default_proba: np.ndarray) -> np.ndarray:
+    """
+    Difference between the probabilities of the most and least likely outcome.
+    """
+    repay_proba = 1 - default_proba
+    return np.maximum(repay_proba, default_proba) - np.minimum(
+        repay_proba, default_proba
+    )
+
+
+def get_entropy(default_proba: np.ndarray) -> np.ndarray:
+    """
+    Shannon entropy (in nats) of the outcome distribution.
+    """
+    repay_proba = 1 - default_proba
+    # NOTE: Normalized as scipy.stats.entropy does, to match modAL's entropy_sampling
+    total_proba = repay_proba + default_proba
+    return entr(repay_proba / total_proba) + entr(default_proba / total_proba)
+
+
+def get_density(X: np.ndarray) -> np.ndarray:
+    """
+    Density of each row of X under a diagonal Gaussian fitted to all rows, scaled to at most 1.
+
+    A linear-time stand-in for the mean pairwise similarity of information density.
+    """
+    X = np.asarray(X, dtype="float64").reshape(X.shape[0], -1)
+    X_std = X.std(axis=0)
+    X_std[X_std == 0] = 1
+    z = (X - X.mean(axis=0)) / X_std
+    return np.exp(-0.5 * np.square(z).sum(axis=1))
+
+
+def uncertainty_sampling(default_proba, X, n_instances: int) -> np.ndarray:
+    """
+    Select the applicants whose outcome the model is least sure about.
+    """
+    return top_k(get_uncertainty(default_proba), n_instances)
+
+
+def margin_sampling(default_proba, X, n_instances: int) -> np.ndarray:
+    """
+    Select the applicants with the smallest margin between outcome probabilities.
+    """
+    return top_k(-get_margin(default_proba), n_instances)
+
+
+def entropy_sampling(default_proba, X, n_instances: int) -> np.ndarray:
+    """
+    Select the applicants with the highest outcome entropy.
+    """
+    return top_k(get_entropy(default_proba), n_instances)
+
+
+def density_weighted_sampling(default_proba, X, n_instances: int) -> np.ndarray:
+    """
+    Select uncertain applicants, weighted towards the dense parts of the applicant pool.
+
+    Avoids spending research loans on outliers, whose outcomes say little about the
+    rest of the pool.
+    """
+    return top_k(get_entropy(default_proba) * get_density(X), n_instances)
+
+
+query_strategies = {
+    "uncertainty_sampling": uncertainty_sampling,
+    "margin_sampling": margin_sampling,
+    "entropy_sampling": entropy_sampling,
+    "density_weighted_sampling": density_weighted_sampling,
+}
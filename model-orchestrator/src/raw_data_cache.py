@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather
+
+# NOTE: Schema metadata of mirrored files
+version_key = b"synthetic_data_version"
+
+
+class RawDataCache:
+    """
+    Process-wide cache of per-simulation data frames, keyed by simulation_id.
+
+    Frames are held in a least-recently-used order and evicted once their combined
+    in-memory size exceeds max_bytes. If local_dir is set, every frame fetched by
+    the loader is mirrored there as an uncompressed Arrow IPC (Feather v2) file, so
+    that later processes skip the download. Mirrored files are memory-mapped, so
+    processes on one machine share the pages of their numeric columns. With get_version,
+    each file records the version of the data it mirrors (e.g. its ETag), and is replaced
+    once the version in storage differs.
+
+    Cached frames are shared: callers must copy before modifying them.
+    """
+
+    def __init__(self, loader, max_bytes: int, local_dir: str = None, get_version=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.local_dir = local_dir
+        self.get_version = get_version
+        self.hits = 0
+        self.misses = 0
+        self.n_bytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, simulation_id: str) -> pd.DataFrame:
+        """
+        Fetch raw data for simulation_id, loading it on a cache miss.
+        """
+        with self._lock:
+            if simulation_id in self._frames:
+                self.hits += 1
+                self._frames.move_to_end(simulation_id)
+                return self._frames[simulation_id][0]
+            self.misses += 1
+
+        raw_df = self._load(simulation_id)
+        n_bytes = int(raw_df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            if simulation_id not in self._frames:
+                self._frames[simulation_id] = (raw_df, n_bytes)
+                self.n_bytes += n_bytes
+                self._evict_to_size()
+            return raw_df
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.n_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._frames),
+                "bytes": self.n_bytes,
+            }
+
+    def _evict_to_size(self):
+        # NOTE: The most recently used frame is always kept, even if it alone exceeds max_bytes
+        while self.n_bytes > self.max_bytes and len(self._frames) > 1:
+            _, (_, n_bytes) = self._frames.popitem(last=False)
+            self.n_bytes -= n_bytes
+
+    def _local_path(self, simulation_id: str) -> str:
+        return os.path.join(self.local_dir, f"{simulation_id}.arrow")
+
+    def _load(self, simulation_id: str) -> pd.DataFrame:
+        if self.local_dir is None:
+            return self.loader(simulation_id)
+
+        local_path = self._local_path(simulation_id)
+        version = None if self.get_version is None else self.get_version(simulation_id)
+        if os.path.exists(local_path):
+            table = pyarrow.feather.read_table(local_path, memory_map=True)
+            mirrored_version = (table.schema.metadata or {}).get(version_key)
+            if version is None or mirrored_version == version.encode():
+                return table.to_pandas(split_blocks=True)
+
+        raw_df = self.loader(simulation_id)
+        table = pa.Table.from_pandas(raw_df)
+        if version is not None:
+            table = table.replace_schema_metadata(
+                {**table.schema.metadata, version_key: version.encode()}
+            )
+        os.makedirs(self.local_dir, exist_ok=True)
+        # Write to a temporary file first, so concurrent readers never see partial files
+        tmp_path = f"{local_path}.{os.getpid()}.tmp"
+        pyarrow.feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, local_path)
+        return raw_df
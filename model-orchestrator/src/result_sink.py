@@ -0,0 +1,355 @@
+import os
+import threading
+import time
+import uuid
+from multiprocessing.util import Finalize
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset
+import pyarrow.fs
+import pyarrow.parquet as pq
+
+from schema import to_arrow
+
+
+def get_filesystem(root_uri: str):
+    """
+    Filesystem and base path for an s3:// URI or a local directory.
+    """
+    if "://" not in root_uri:
+        root_uri = os.path.abspath(root_uri)
+    return pyarrow.fs.FileSystem.from_uri(root_uri)
+
+
+class ArrowFileWriter:
+    """
+    Writer of an Arrow IPC (Feather v2) file, with the interface of pq.ParquetWriter.
+
+    Files are uncompressed, so that readers can memory-map them and use their columns in place.
+    """
+
+    def __init__(self, path: str, schema: pa.Schema, filesystem):
+        self.schema = schema
+        self._sink = filesystem.open_output_stream(path)
+        self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def write_table(self, table: pa.Table, row_group_size: int = None):
+        self._writer.write_table(table, max_chunksize=row_group_size)
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+
+
+file_writers = {"parquet": pq.ParquetWriter, "arrow": ArrowFileWriter}
+
+manifest_table = "manifest"
+
+
+class ResultSink:
+    """
+    Buffered writer of simulation results into Parquet or Arrow IPC datasets, partitioned by
+    scenario_id.
+
+    Each table is written to {root_uri}/{table}/scenario_id={scenario_id}/part-*.{file_format},
+    with one file per table, scenario and process. Rows are buffered per partition and written
+    as row groups (record batches) of row_group_size rows, so that runs of a sweep end up in a
+    few well-sized files instead of one small object per run. The scenario_id column is encoded
+    in the path only.
+
+    Rows of a (simulation_id, scenario_id) run are staged until the run is completed with
+    complete_run, so that files never hold rows of failed runs. Files are only complete once
+    they are committed: commit finalizes the open files and records the runs written to them,
+    with their part files, in the manifest ({root_uri}/manifest/part-*.parquet). The sink
+    commits every commit_interval seconds and when it is closed; in worker processes this
+    happens when the process exits. Runs in the manifest therefore survive an interrupted
+    sweep, which resume picks up from.
+    """
+
+    def __init__(
+        self,
+        root_uri: str,
+        row_group_size: int = 2**17,
+        file_format="parquet",
+        commit_interval: float = 300,
+    ):
+        if file_format not in file_writers:
+            raise ValueError(f"Unknown result file format {file_format}")
+        self.root_uri = root_uri
+        self.row_group_size = row_group_size
+        self.file_format = file_format
+        self.commit_interval = commit_interval
+        self._filesystem = None
+        self._base_path = None
+        self._staged = {}
+        self._buffers = {}
+        self._writers = {}
+        self._paths = {}
+        self._runs = []
+        self._last_commit = time.monotonic()
+        self._pid = None
+        self._lock = threading.RLock()
+
+    def _get_filesystem(self):
+        # NOTE: Resolved lazily, as connecting to S3 may look up the bucket's region
+        if self._filesystem is None:
+            self._filesystem, self._base_path = get_filesystem(self.root_uri)
+        return self._filesystem, self._base_path.rstrip("/")
+
+    def _attach_to_process(self):
+        # NOTE: Buffers and writers inherited from a parent process (fork) belong to the parent
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._staged = {}
+            self._buffers = {}
+            self._writers = {}
+            self._paths = {}
+            self._runs = []
+            self._last_commit = time.monotonic()
+            Finalize(self, self.close, exitpriority=10)
+
+    def write(self, table: str, df: pd.DataFrame):
+        """
+        Stage the rows of df (which must be of a single simulation_id and scenario_id) for
+        table, until their run is completed.
+        """
+        if df.shape[0] == 0:
+            return
+        runs = df[["simulation_id", "scenario_id"]].drop_duplicates()
+        assert runs.shape[0] == 1, f"Expected rows of a single run, got {runs}"
+        run = (str(runs.simulation_id.iloc[0]), str(runs.scenario_id.iloc[0]))
+
+        with self._lock:
+            self._attach_to_process()
+            self._staged.setdefault(run, []).append(
+                (table, df.drop(columns="scenario_id"))
+            )
+
+    def complete_run(self, simulation_id: str, scenario_id: str, **attributes):
+        """
+        Buffer the staged rows of a run for writing, and record the run with its attributes
+        (e.g. versions of its inputs) in the manifest at the next commit.
+        """
+        with self._lock:
+            self._attach_to_process()
+            partitions = set()
+            run = (str(simulation_id), str(scenario_id))
+            for table, df in self._staged.pop(run, []):
+                key = (table, scenario_id)
+                partitions.add(key)
+                buffer = self._buffers.setdefault(key, [])
+                buffer.append(df)
+                if sum(chunk.shape[0] for chunk in buffer) >= self.row_group_size:
+                    self._flush_partition(key)
+            self._runs.append(
+                (
+                    {
+                        "simulation_id": simulation_id,
+                        "scenario_id": scenario_id,
+                        **attributes,
+                    },
+                    partitions,
+                )
+            )
+            if time.monotonic() - self._last_commit >= self.commit_interval:
+                self.commit()
+
+    def discard_run(self, simulation_id: str, scenario_id: str):
+        """
+        Drop the staged rows of a run which failed before it completed, e.g. so that it can
+        be retried in this process.
+        """
+        with self._lock:
+            self._attach_to_process()
+            self._staged.pop((str(simulation_id), str(scenario_id)), None)
+
+    def write_table(self, table: str, df: pd.DataFrame):
+        """
+        Write df as the single, unpartitioned file of table, e.g. for the scenarios of a sweep.
+        """
+        filesystem, base_path = self._get_filesystem()
+        filesystem.create_dir(f"{base_path}/{table}", recursive=True)
+        pq.write_table(
+            to_arrow(df),
+            f"{base_path}/{table}/{table}.parquet",
+            filesystem=filesystem,
+        )
+
+    def _flush_partition(self, key):
+        buffer = self._buffers.pop(key, [])
+        if not buffer:
+            return
+        # NOTE: Categories differ between simulations, so concatenated ids fall back to strings
+        table = to_arrow(pd.concat(buffer, ignore_index=True))
+
+        writer = self._writers.get(key)
+        if writer is None:
+            filesystem, base_path = self._get_filesystem()
+            table_name, scenario_id = key
+            partition_path = f"{base_path}/{table_name}/scenario_id={scenario_id}"
+            filesystem.create_dir(partition_path, recursive=True)
+            path = f"{partition_path}/part-{uuid.uuid4().hex}.{self.file_format}"
+            writer = file_writers[self.file_format](
+                path, table.schema, filesystem=filesystem
+            )
+            self._writers[key] = writer
+            self._paths[key] = path
+        elif not table.schema.equals(writer.schema, check_metadata=False):
+            # NOTE: e.g. an all-integer column in one run and a float column in another
+            table = table.cast(writer.schema)
+
+        writer.write_table(table, row_group_size=self.row_group_size)
+
+    def flush(self):
+        """
+        Write all buffered rows.
+        """
+        with self._lock:
+            for key in list(self._buffers):
+                self._flush_partition(key)
+
+    def commit(self):
+        """
+        Write all buffered rows, finalize the open files and record the runs written to them
+        in the manifest. Later rows go to new files.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self.flush()
+            for writer in self._writers.values():
+                writer.close()
+            runs, paths = self._runs, self._paths
+            self._writers = {}
+            self._paths = {}
+            self._runs = []
+            self._last_commit = time.monotonic()
+            if not runs:
+                return
+
+            _, base_path = self._get_filesystem()
+            self._write_manifest_part(
+                pd.DataFrame(
+                    [
+                        {
+                            **run,
+                            "part_keys": sorted(
+                                paths[key][len(base_path) + 1 :]
+                                for key in partitions
+                                if key in paths
+                            ),
+                        }
+                        for run, partitions in runs
+                    ]
+                )
+            )
+
+    def _write_manifest_part(self, manifest_df: pd.DataFrame):
+        filesystem, base_path = self._get_filesystem()
+        manifest_path = f"{base_path}/{manifest_table}"
+        filesystem.create_dir(manifest_path, recursive=True)
+        # NOTE: Written under a temporary name (ignored by readers), then moved into place
+        part_name = f"part-{uuid.uuid4().hex}.parquet"
+        pq.write_table(
+            pa.Table.from_pandas(manifest_df, preserve_index=False),
+            f"{manifest_path}/_{part_name}",
+            filesystem=filesystem,
+        )
+        filesystem.move(f"{manifest_path}/_{part_name}", f"{manifest_path}/{part_name}")
+
+    def close(self):
+        """
+        Commit all completed runs. Staged rows of runs which did not complete are dropped.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self.commit()
+            self._staged = {}
+
+    def read_manifest(self) -> pd.DataFrame:
+        """
+        Committed runs, with their attributes and part files (part_keys, relative to root_uri).
+        """
+        filesystem, base_path = self._get_filesystem()
+        if not self.list_part_keys([manifest_table]):
+            return pd.DataFrame(columns=["simulation_id", "scenario_id", "part_keys"])
+        return (
+            pyarrow.dataset.dataset(
+                f"{base_path}/{manifest_table}", filesystem=filesystem, format="parquet"
+            )
+            .to_table()
+            .to_pandas()
+        )
+
+    def list_part_keys(self, tables) -> set:
+        """
+        Part files of tables, relative to root_uri.
+        """
+        filesystem, base_path = self._get_filesystem()
+        return {
+            info.path[len(base_path) + 1 :]
+            for table in tables
+            for info in filesystem.get_file_info(
+                pyarrow.fs.FileSelector(
+                    f"{base_path}/{table}", recursive=True, allow_not_found=True
+                )
+            )
+            if info.type == pyarrow.fs.FileType.File
+            and info.base_name.startswith("part-")
+        }
+
+    def resume(self, tables, is_valid_run) -> pd.DataFrame:
+        """
+        Runs of the manifest to keep, e.g. when resuming an interrupted sweep: those for which
+        is_valid_run(run) holds (run being a row of the manifest) and whose part files exist.
+
+        Part files of tables which hold rows of other runs, or of no committed run (e.g. of an
+        interrupted process), are deleted, along with the runs they hold, so that these runs
+        can be run again without duplicating rows. The manifest is rewritten as a single file.
+        """
+        with self._lock:
+            manifest_df = self.read_manifest()
+            manifest_keys = self.list_part_keys([manifest_table])
+            part_keys = self.list_part_keys(tables)
+            is_kept = pd.Series(
+                [
+                    bool(is_valid_run(run)) and set(run.part_keys) <= part_keys
+                    for run in manifest_df.itertuples(index=False)
+                ],
+                index=manifest_df.index,
+                dtype=bool,
+            )
+            # NOTE: Runs sharing a file with a dropped run are dropped as well, transitively
+            while True:
+                dropped_keys = {
+                    key for keys in manifest_df.part_keys[~is_kept] for key in keys
+                }
+                is_dropped = is_kept & manifest_df.part_keys.map(
+                    lambda keys: not dropped_keys.isdisjoint(keys)
+                ).astype(bool)
+                if not is_dropped.any():
+                    break
+                is_kept &= ~is_dropped
+
+            kept_df = manifest_df.loc[is_kept].reset_index(drop=True)
+            kept_keys = {key for keys in kept_df.part_keys for key in keys}
+            filesystem, base_path = self._get_filesystem()
+            for key in sorted(part_keys - kept_keys):
+                filesystem.delete_file(f"{base_path}/{key}")
+
+            # NOTE: The new manifest is in place before the previous one is deleted
+            if kept_df.shape[0] > 0:
+                self._write_manifest_part(kept_df)
+            for key in sorted(manifest_keys):
+                filesystem.delete_file(f"{base_path}/{key}")
+            return kept_df
+
+    def clear(self, tables):
+        """
+        Delete the previous contents of tables, and the manifest of committed runs.
+        """
+        filesystem, base_path = self._get_filesystem()
+        for table in [*tables, manifest_table]:
+            filesystem.delete_dir_contents(f"{base_path}/{table}", missing_dir_ok=True)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+from functools import lru_cache
+from typing import Callable, NamedTuple, Optional
+
+import pandas as pd
+from yaml import safe_load
+
+from query_strategies import query_strategies
+from training import training_modes
+
+scenario_fields = [
+    "id",
+    "research_acceptance_rate",
+    "active_learning_spec",
+    "training_mode",
+    "first_application_date",
+    "n_periods",
+    "applications_per_period",
+]
+# NOTE: Optional fields and their defaults; by default the first application date of the
+# synthetic data is the historical period, followed by 9 simulated periods of all applications
+scenario_defaults = {
+    "training_mode": "full",
+    "first_application_date": None,
+    "n_periods": 9,
+    "applications_per_period": None,
+}
+
+
+class Scenario(NamedTuple):
+    """
+    A single scenario, as specified in scenarios.yml.
+    """
+
+    id: str
+    research_acceptance_rate: float
+    active_learning_spec: str
+    training_mode: str
+    first_application_date: Optional[int]
+    n_periods: int
+    applications_per_period: Optional[int]
+    # NOTE: Resolved from active_learning_spec; None for random research portfolios
+    query_strategy: Optional[Callable]
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in scenario_fields}
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the scenario's settings, which changes whenever any of them does.
+        """
+        settings = json.dumps(self.to_dict(), sort_keys=True)
+        return hashlib.sha256(settings.encode()).hexdigest()[:16]
+
+
+def parse_scenario(spec: dict) -> Scenario:
+    """
+    Validate a scenario specification and resolve its active learning query strategy.
+    """
+    spec = {**scenario_defaults, **spec}
+    missing_fields = set(scenario_fields) - set(spec)
+    if missing_fields:
+        raise ValueError(f"Scenario {spec} is missing {sorted(missing_fields)}")
+
+    research_acceptance_rate = float(spec["research_acceptance_rate"])
+    if not 0 <= research_acceptance_rate <= 1:
+        raise ValueError(
+            f"Scenario {spec['id']}: research_acceptance_rate must be between 0 and 1"
+        )
+
+    active_learning_spec = spec["active_learning_spec"]
+    if active_learning_spec == "random":
+        query_strategy = None
+    elif active_learning_spec in query_strategies:
+        query_strategy = query_strategies[active_learning_spec]
+    else:
+        raise ValueError(
+            f"Scenario {spec['id']}: unknown active_learning_spec {active_learning_spec}"
+        )
+
+    training_mode = spec["training_mode"]
+    if training_mode not in training_modes:
+        raise ValueError(
+            f"Scenario {spec['id']}: training_mode must be one of {training_modes}"
+        )
+
+    first_application_date = spec["first_application_date"]
+    if first_application_date is not None:
+        first_application_date = int(first_application_date)
+
+    n_periods = int(spec["n_periods"])
+    if n_periods < 1:
+        raise ValueError(f"Scenario {spec['id']}: n_periods must be at least 1")
+
+    applications_per_period = spec["applications_per_period"]
+    if applications_per_period is not None:
+        applications_per_period = int(applications_per_period)
+        if applications_per_period < 1:
+            raise ValueError(
+                f"Scenario {spec['id']}: applications_per_period must be at least 1"
+            )
+
+    return Scenario(
+        id=str(spec["id"]),
+        research_acceptance_rate=research_acceptance_rate,
+        active_learning_spec=active_learning_spec,
+        training_mode=training_mode,
+        first_application_date=first_application_date,
+        n_periods=n_periods,
+        applications_per_period=applications_per_period,
+        query_strategy=query_strategy,
+    )
+
+
+class ScenarioRegistry:
+    """
+    Validated scenarios, indexed by scenario id.
+    """
+
+    __slots__ = ("_scenarios",)
+
+    def __init__(self, scenarios):
+        self._scenarios = {}
+        for scenario in scenarios:
+            if scenario.id in self._scenarios:
+                raise ValueError(f"Duplicate scenario id {scenario.id}")
+            self._scenarios[scenario.id] = scenario
+
+    def __getitem__(self, scenario_id: str) -> Scenario:
+        return self._scenarios[scenario_id]
+
+    def __iter__(self):
+        return iter(self._scenarios.values())
+
+    def __len__(self) -> int:
+        return len(self._scenarios)
+
+    @property
+    def ids(self) -> list:
+        return list(self._scenarios)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Scenarios as a DataFrame, one row per scenario.
+        """
+        return pd.DataFrame([scenario.to_dict() for scenario in self])
+
+
+@lru_cache(maxsize=None)
+def load_scenario_registry(path="scenarios.yml") -> ScenarioRegistry:
+    """
+    Set of scenarios which will be modeled, specified in YAML. Parsed once per process.
+    """
+    with open(path, "r") as f:
+        scenarios = safe_load(f)
+    return ScenarioRegistry(parse_scenario(spec) for spec in scenarios["scenarios"])
@@ -0,0 +1,80 @@
+"""
+Compact dtypes of synthetic data and result tables, in memory and in exported files.
+
+Tables are normalized when synthetic data is loaded, and every result row is a slice of the
+loaded synthetic data, so the dtypes carry through the simulation and into the export:
+
+    simulation_id, application_id  categorical (dictionary-encoded), sharing one set of
+                                    categories per simulation instead of a string per row
+    portfolio                       categorical (business, research)
+    application_date                int16
+    default, counterfactual_default uint8
+    credit_granted                  bool
+    funding_probability             float32 (1 for business loans, NaN for research loans)
+
+Features and risk parameters stay float64, so that models and scores are unchanged.
+"""
+
+import pandas as pd
+import pyarrow as pa
+
+portfolios = ["business", "research"]
+
+column_dtypes = {
+    "simulation_id": "category",
+    "application_id": "category",
+    "application_code": "int32",
+    "application_date": "int16",
+    "default": "uint8",
+    "counterfactual_default": "uint8",
+    "portfolio": pd.CategoricalDtype(portfolios),
+    "credit_granted": "bool",
+    "funding_probability": "float32",
+}
+
+# NOTE: Application ids are unique per row, so they are exported as plain strings. Arrow
+# dictionaries of categoricals hold all categories of the simulation, used or not.
+arrow_types = {
+    "simulation_id": pa.dictionary(pa.int32(), pa.string()),
+    "application_id": pa.string(),
+    "application_date": pa.int16(),
+    "default": pa.uint8(),
+    "counterfactual_default": pa.uint8(),
+    "portfolio": pa.dictionary(pa.int8(), pa.string()),
+    "credit_granted": pa.bool_(),
+    "funding_probability": pa.float32(),
+}
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    df with the columns of column_dtypes cast to their compact dtypes (other columns as is).
+
+    Categorical columns are kept with their categories, so that slices of one frame can be
+    concatenated without falling back to strings.
+    """
+    dtypes = {
+        column: dtype
+        for column, dtype in column_dtypes.items()
+        if column in df.columns and df[column].dtype != dtype
+    }
+    # NOTE: Columns which keep their dtype are not copied, e.g. memory-mapped synthetic data
+    return df.astype(dtypes, copy=False) if dtypes else df
+
+
+def get_arrow_schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    Arrow schema to export df with, using the compact types of arrow_types.
+    """
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if field.name in arrow_types:
+            schema = schema.set(i, field.with_type(arrow_types[field.name]))
+    return schema
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    df as an Arrow table with the compact types of arrow_types.
+    """
+    return pa.Table.from_pandas(df, schema=get_arrow_schema(df), preserve_index=False)
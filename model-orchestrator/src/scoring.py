@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from sklearn.preprocessing import StandardScaler
+
+
+def get_passthrough_columns(column_trans) -> list:
+    """
+    Input columns of a fitted ColumnTransformer which only passes columns through.
+    """
+    columns = []
+    for name, transformer, transformer_columns in column_trans.transformers_:
+        if transformer == "drop" or name == "remainder":
+            continue
+        if transformer != "passthrough":
+            raise ValueError(f"Cannot extract scorer from transformer {name}")
+        columns.extend(transformer_columns)
+    return columns
+
+
+class LogisticScorer:
+    """
+    Coefficients of a fitted binary linear classifier pipeline (feature selection, optionally
+    a StandardScaler, and classifier).
+
+    Default probabilities are computed with the same expression as sklearn's predict_proba for
+    LogisticRegression and SGDClassifier, expit(X @ coef.T + intercept), so they are numerically
+    identical, without the per-call overhead of the pipeline. A StandardScaler is folded into
+    the coefficients, which then agree with the pipeline up to rounding.
+    """
+
+    __slots__ = ("columns", "coef", "intercept")
+
+    def __init__(self, columns, coef: np.ndarray, intercept: np.ndarray):
+        self.columns = list(columns)
+        self.coef = coef
+        self.intercept = intercept
+
+    @classmethod
+    def from_pipeline(cls, model_pipeline) -> "LogisticScorer":
+        column_trans, classifier = model_pipeline[0], model_pipeline[-1]
+        scalers = model_pipeline[1:-1]
+        if (
+            len(scalers) > 1
+            or not all(isinstance(scaler, StandardScaler) for scaler in scalers)
+            or classifier.coef_.shape[0] != 1
+        ):
+            raise ValueError(
+                "Expected a fitted binary (feature selection, [scaler], classifier) pipeline"
+            )
+        coef, intercept = classifier.coef_, classifier.intercept_
+        for scaler in scalers:
+            coef = coef / scaler.scale_
+            intercept = intercept - coef @ scaler.mean_
+        return cls(get_passthrough_columns(column_trans), coef, intercept)
+
+    def get_features(self, df: pd.DataFrame) -> np.ndarray:
+        return df.loc[:, self.columns].to_numpy(dtype="float64")
+
+    def predict_default_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Estimated default probability of each row of df.
+        """
+        return expit(self.get_features(df) @ self.coef.T + self.intercept).ravel()
+
+
+def score_stacked(X: np.ndarray, coef: np.ndarray, intercept: np.ndarray) -> np.ndarray:
+    """
+    Default probabilities of the rows of features X under several models, with their
+    coefficients (model x feature) and intercepts (model) stacked, shape (model, row).
+
+    Scores all models in a single matrix product, e.g. for the models of the scenarios of a
+    batch applied to shared applicants.
+    """
+    return expit(coef @ X.T + intercept[:, np.newaxis])
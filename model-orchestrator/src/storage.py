@@ -0,0 +1,497 @@
+"""
+Storage backends for synthetic data and simulation results.
+
+The backend is selected with STORAGE_BACKEND:
+
+    s3     objects in the S3_BUCKET_NAME bucket (default)
+    local  Parquet files in the STORAGE_ROOT directory, laid out like the bucket
+    arrow  as local, but synthetic data is read from memory-mapped Arrow IPC files
+
+To run offline, mirror the synthetic data once, e.g.
+`python storage.py mirror /data/alec --format arrow`.
+
+Part files of result datasets may be Parquet (.parquet) or Arrow IPC (.arrow) files, with all
+backends. Readers take a list of columns, so that only those columns are decoded; in Arrow IPC
+files, the other columns are not even read from disk.
+"""
+
+import argparse
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import boto3
+import botocore.config
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset
+import pyarrow.parquet as pq
+
+
+def get_simulation_id(key: str) -> str:
+    """
+    Simulation id of a synthetic_data/{simulation_id}.{extension} key.
+    """
+    return key.split("/")[-1].split(".")[0]
+
+
+def read_arrow_file(source, columns=None) -> pa.Table:
+    """
+    Columns of an Arrow IPC file, e.g. a memory-mapped file (zero-copy) or a downloaded buffer.
+    """
+    table = pa.ipc.open_file(source).read_all()
+    return table if columns is None else table.select(columns)
+
+
+def get_partition_value(key: str, partition: str = "scenario_id") -> str:
+    """
+    Value of a hive-style partition ({partition}={value}) in a key.
+    """
+    for part in key.split("/"):
+        if part.startswith(f"{partition}="):
+            return part.split("=", 1)[1]
+    raise ValueError(f"{key} is not partitioned by {partition}")
+
+
+class LocalStorage:
+    """
+    Directory laid out like the S3 bucket.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    @property
+    def root_uri(self) -> str:
+        return self.root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def list_simulation_ids(self) -> list:
+        synthetic_data_dir = self._path("synthetic_data")
+        if not os.path.isdir(synthetic_data_dir):
+            return []
+        return sorted(
+            get_simulation_id(file_name)
+            for file_name in os.listdir(synthetic_data_dir)
+            if not file_name.startswith(".")
+        )
+
+    def prefetch(self, simulation_ids):
+        """
+        Start loading the synthetic data of simulation_ids ahead of use (no-op for local files).
+        """
+
+    def read_synthetic_data(self, simulation_id: str, columns=None) -> pd.DataFrame:
+        return self.read_table(
+            f"synthetic_data/{simulation_id}.parquet", columns=columns
+        )
+
+    def write_synthetic_data(self, simulation_id: str, df: pd.DataFrame):
+        self.write_table(f"synthetic_data/{simulation_id}.parquet", df)
+
+    def clear_synthetic_data(self):
+        """
+        Delete all synthetic data.
+        """
+        synthetic_data_dir = self._path("synthetic_data")
+        if os.path.isdir(synthetic_data_dir):
+            for file_name in os.listdir(synthetic_data_dir):
+                os.remove(os.path.join(synthetic_data_dir, file_name))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def read_table(self, key: str, columns=None) -> pd.DataFrame:
+        return self._read_arrow_table(key, columns=columns).to_pandas()
+
+    def _read_arrow_table(self, key: str, columns=None) -> pa.Table:
+        # NOTE: Arrow IPC files are memory-mapped, so processes reading a file share its pages
+        if key.endswith(".arrow"):
+            return read_arrow_file(pa.memory_map(self._path(key)), columns=columns)
+        return pq.read_table(self._path(key), columns=columns)
+
+    def write_table(self, key: str, df: pd.DataFrame):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        pq.write_table(pa.Table.from_pandas(df), tmp_path)
+        os.replace(tmp_path, path)
+
+    def list_partitions(self, table: str) -> list:
+        """
+        Scenario ids of the partitions of a result dataset.
+        """
+        return sorted(
+            get_partition_value(dir_name)
+            for dir_name in os.listdir(self._path(table))
+            if dir_name.startswith("scenario_id=")
+        )
+
+    def list_parts(self, table: str) -> dict:
+        """
+        Files of a dataset, as {key: version}, where the version changes whenever the file is
+        rewritten.
+        """
+        table_dir = self._path(table)
+        if not os.path.isdir(table_dir):
+            return {}
+        parts = {}
+        for dir_path, _, file_names in os.walk(table_dir):
+            for file_name in file_names:
+                if file_name.endswith((".parquet", ".arrow")):
+                    path = os.path.join(dir_path, file_name)
+                    key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    parts[key] = self.get_version(key)
+        return parts
+
+    def get_version(self, key: str) -> str:
+        """
+        Version of a file, which changes whenever it is rewritten, or None if it does not exist.
+        """
+        if not self.exists(key):
+            return None
+        stat = os.stat(self._path(key))
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+    def read_part(self, key: str, columns=None) -> pd.DataFrame:
+        """
+        Rows of a single part file of a result dataset, with scenario_id from its partition.
+        """
+        return (
+            self._read_arrow_table(key, columns=columns)
+            .to_pandas()
+            .assign(scenario_id=get_partition_value(key))
+        )
+
+    def read_dataset(
+        self, table: str, scenario_id: str = None, columns=None
+    ) -> pd.DataFrame:
+        """
+        Rows of a result dataset (optionally of one scenario only), with scenario_id restored
+        from the partitioning.
+        """
+        prefix = (
+            f"{table}/"
+            if scenario_id is None
+            else f"{table}/scenario_id={scenario_id}/"
+        )
+        keys = [key for key in self.list_parts(table) if key.startswith(prefix)]
+
+        # NOTE: Parquet and Arrow IPC parts (e.g. of appended sweeps) are read as separate datasets
+        dfs = []
+        for file_format, extension in [("parquet", ".parquet"), ("ipc", ".arrow")]:
+            paths = [self._path(key) for key in keys if key.endswith(extension)]
+            if not paths:
+                continue
+            dataset = pyarrow.dataset.dataset(
+                paths,
+                format=file_format,
+                partitioning="hive",
+                partition_base_dir=self._path(table),
+            )
+            dfs.append(
+                dataset.to_table(
+                    columns=None if columns is None else [*columns, "scenario_id"]
+                ).to_pandas()
+            )
+        if not dfs:
+            raise FileNotFoundError(f"No part files in {self._path(prefix)}")
+        df = pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
+        df["scenario_id"] = df.scenario_id.astype(str)
+        return df
+
+
+class ArrowStorage(LocalStorage):
+    """
+    Local directory where synthetic data is stored as Arrow IPC files, which are memory-mapped.
+
+    Reading a simulation maps the file instead of decoding Parquet, so repeated reads (e.g. by
+    several worker processes) share the operating system's page cache. Numeric columns are
+    not even copied into the process: their DataFrame columns are read-only views of the map.
+    """
+
+    def read_synthetic_data(self, simulation_id: str, columns=None) -> pd.DataFrame:
+        # NOTE: One block per column keeps columns of a single chunk zero-copy
+        return self._read_arrow_table(
+            f"synthetic_data/{simulation_id}.arrow", columns=columns
+        ).to_pandas(split_blocks=True)
+
+    def write_synthetic_data(self, simulation_id: str, df: pd.DataFrame):
+        path = self._path(f"synthetic_data/{simulation_id}.arrow")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df)
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+class S3Storage:
+    """
+    S3 bucket, accessed with a pooled boto3 client.
+
+    Objects are downloaded on a thread pool of max_connections threads. Synthetic data passed
+    to prefetch is downloaded up to prefetch_depth simulations ahead of the one being read.
+    """
+
+    def __init__(self, bucket_name: str, max_connections: int = 16, prefetch_depth=4):
+        self.bucket_name = bucket_name
+        self.max_connections = max_connections
+        self.prefetch_depth = prefetch_depth
+        self._client = None
+        self._executor = None
+        self._pid = None
+        self._prefetch_queue = []
+        self._prefetched = {}
+        self._lock = threading.RLock()
+
+    @property
+    def root_uri(self) -> str:
+        return f"s3://{self.bucket_name}"
+
+    def _attach_to_process(self):
+        # NOTE: Clients and threads do not survive a fork, so each process creates its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._client = boto3.session.Session().client(
+                "s3",
+                config=botocore.config.Config(
+                    max_pool_connections=self.max_connections
+                ),
+            )
+            self._executor = ThreadPoolExecutor(self.max_connections)
+            self._prefetch_queue = []
+            self._prefetched = {}
+
+    @property
+    def client(self):
+        with self._lock:
+            self._attach_to_process()
+            return self._client
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            self._attach_to_process()
+            return self._executor
+
+    def list_objects(self, prefix: str) -> list:
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [
+            obj
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix)
+            for obj in page.get("Contents", [])
+        ]
+
+    def list_keys(self, prefix: str) -> list:
+        return [obj["Key"] for obj in self.list_objects(prefix)]
+
+    def exists(self, key: str) -> bool:
+        return key in self.list_keys(key)
+
+    def list_simulation_ids(self) -> list:
+        return [
+            get_simulation_id(key)
+            for key in self.list_keys("synthetic_data/")
+            if not key.endswith("/")
+        ]
+
+    def _read_arrow_table(self, key: str, columns=None) -> pa.Table:
+        body = self.client.get_object(Bucket=self.bucket_name, Key=key)["Body"].read()
+        if key.endswith(".arrow"):
+            return read_arrow_file(pa.BufferReader(body), columns=columns)
+        return pq.read_table(pa.BufferReader(body), columns=columns)
+
+    def _schedule_prefetch(self):
+        while self._prefetch_queue and len(self._prefetched) < self.prefetch_depth:
+            simulation_id = self._prefetch_queue.pop(0)
+            self._prefetched[simulation_id] = self.executor.submit(
+                self._read_arrow_table, f"synthetic_data/{simulation_id}.parquet"
+            )
+
+    def prefetch(self, simulation_ids):
+        """
+        Start downloading the synthetic data of simulation_ids, in order, ahead of use.
+        """
+        with self._lock:
+            self._attach_to_process()
+            self._prefetch_queue.extend(
+                simulation_id
+                for simulation_id in simulation_ids
+                if simulation_id not in self._prefetched
+            )
+            self._schedule_prefetch()
+
+    def read_synthetic_data(self, simulation_id: str, columns=None) -> pd.DataFrame:
+        with self._lock:
+            self._attach_to_process()
+            future = self._prefetched.pop(simulation_id, None)
+            if simulation_id in self._prefetch_queue:
+                self._prefetch_queue.remove(simulation_id)
+            self._schedule_prefetch()
+        if future is not None:
+            table = future.result()
+            return (table if columns is None else table.select(columns)).to_pandas()
+        return self.read_table(
+            f"synthetic_data/{simulation_id}.parquet", columns=columns
+        )
+
+    def write_synthetic_data(self, simulation_id: str, df: pd.DataFrame):
+        self.write_table(f"synthetic_data/{simulation_id}.parquet", df)
+
+    def clear_synthetic_data(self):
+        """
+        Delete all synthetic data.
+        """
+        keys = self.list_keys("synthetic_data/")
+        # NOTE: delete_objects accepts at most 1000 keys per request
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[start : start + 1000]]
+                },
+            )
+
+    def read_table(self, key: str, columns=None) -> pd.DataFrame:
+        return self._read_arrow_table(key, columns=columns).to_pandas()
+
+    def write_table(self, key: str, df: pd.DataFrame):
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(df), buffer)
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=buffer.getvalue())
+
+    def list_partitions(self, table: str) -> list:
+        """
+        Scenario ids of the partitions of a result dataset.
+        """
+        return sorted(
+            {
+                get_partition_value(key)
+                for key in self.list_keys(f"{table}/scenario_id=")
+            }
+        )
+
+    def list_parts(self, table: str) -> dict:
+        """
+        Files of a dataset, as {key: ETag}.
+        """
+        return {
+            obj["Key"]: obj["ETag"].strip('"')
+            for obj in self.list_objects(f"{table}/")
+            if obj["Key"].endswith((".parquet", ".arrow"))
+        }
+
+    def get_version(self, key: str) -> str:
+        """
+        ETag of an object, or None if it does not exist.
+        """
+        for obj in self.list_objects(key):
+            if obj["Key"] == key:
+                return obj["ETag"].strip('"')
+        return None
+
+    def read_part(self, key: str, columns=None) -> pd.DataFrame:
+        """
+        Rows of a single part file of a result dataset, with scenario_id from its partition.
+        """
+        return (
+            self._read_arrow_table(key, columns=columns)
+            .to_pandas()
+            .assign(scenario_id=get_partition_value(key))
+        )
+
+    def read_dataset(
+        self, table: str, scenario_id: str = None, columns=None
+    ) -> pd.DataFrame:
+        """
+        Rows of a result dataset (optionally of one scenario only), with scenario_id restored
+        from the partitioning. Part files are downloaded concurrently.
+        """
+        prefix = (
+            f"{table}/"
+            if scenario_id is None
+            else f"{table}/scenario_id={scenario_id}/"
+        )
+        keys = [
+            key
+            for key in self.list_keys(prefix)
+            if key.endswith((".parquet", ".arrow"))
+        ]
+        tables = self.executor.map(
+            lambda key: self._read_arrow_table(key, columns=columns), keys
+        )
+        df = pd.concat(
+            [
+                table.to_pandas().assign(scenario_id=get_partition_value(key))
+                for key, table in zip(keys, tables)
+            ],
+            ignore_index=True,
+        )
+        return df
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    """
+    Storage backend configured by the environment. Created once per process.
+    """
+    backend = os.getenv("STORAGE_BACKEND", "s3")
+    if backend == "s3":
+        return S3Storage(
+            os.getenv("S3_BUCKET_NAME"),
+            max_connections=int(os.getenv("STORAGE_MAX_CONNECTIONS", 16)),
+            prefetch_depth=int(os.getenv("STORAGE_PREFETCH_DEPTH", 4)),
+        )
+    elif backend in ["local", "arrow"]:
+        root = os.getenv("STORAGE_ROOT")
+        if not root:
+            raise ValueError(
+                f"STORAGE_BACKEND {backend} requires STORAGE_ROOT to be set"
+            )
+        elif backend == "arrow":
+            return ArrowStorage(root)
+        return LocalStorage(root)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend}")
+
+
+def open_storage(root_uri: str):
+    """
+    Storage for an s3://{bucket_name} URI or a local directory, e.g. a results location.
+    """
+    if root_uri.startswith("s3://"):
+        return S3Storage(root_uri[len("s3://") :].rstrip("/"))
+    return LocalStorage(root_uri)
+
+
+def mirror_synthetic_data(source, target: LocalStorage):
+    """
+    Copy all synthetic data from source to target, e.g. from S3 to a local directory.
+    """
+    simulation_ids = source.list_simulation_ids()
+    source.prefetch(simulation_ids)
+    for simulation_id in simulation_ids:
+        target.write_synthetic_data(
+            simulation_id, source.read_synthetic_data(simulation_id)
+        )
+        print(f"Mirrored simulation {simulation_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    mirror_parser = subparsers.add_parser(
+        "mirror", help="copy synthetic data from the configured storage to a directory"
+    )
+    mirror_parser.add_argument("target_dir")
+    mirror_parser.add_argument(
+        "--format", choices=["parquet", "arrow"], default="arrow"
+    )
+    args = parser.parse_args()
+
+    if args.command == "mirror":
+        target_storage_class = ArrowStorage if args.format == "arrow" else LocalStorage
+        mirror_synthetic_data(get_storage(), target_storage_class(args.target_dir))
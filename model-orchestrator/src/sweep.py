@@ -0,0 +1,149 @@
+import functools
+import hashlib
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+
+class SweepTask(NamedTuple):
+    simulation_id: str
+    scenario_id: str
+
+
+class SweepBatch(NamedTuple):
+    simulation_id: str
+    scenario_ids: tuple
+
+
+class TaskResult(NamedTuple):
+    simulation_id: str
+    scenario_id: str
+    succeeded: bool
+    wall_time: float
+    error: Optional[str] = None
+
+
+def get_sweep_tasks(simulation_ids, scenario_ids, order="simulation") -> list:
+    """
+    Enumerate the (simulation_id, scenario_id) grid.
+
+    order: "simulation" keeps all scenarios of a simulation next to each other, "scenario" vice versa
+    """
+    if order == "simulation":
+        return [
+            SweepTask(simulation_id, scenario_id)
+            for simulation_id in simulation_ids
+            for scenario_id in scenario_ids
+        ]
+    return [
+        SweepTask(simulation_id, scenario_id)
+        for scenario_id in scenario_ids
+        for simulation_id in simulation_ids
+    ]
+
+
+def get_task_seed(*keys) -> int:
+    """
+    Deterministic 32 bit random seed for a task, stable across processes and runs.
+
+    NOTE: Python's built-in hash is salted per process, so it cannot be used here.
+    """
+    digest = hashlib.sha256("/".join(str(key) for key in keys).encode()).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def run_task(run_fn, task: SweepTask) -> TaskResult:
+    """
+    Run a single task, capturing failures instead of raising them.
+    """
+    start = time.perf_counter()
+    try:
+        run_fn(task.simulation_id, task.scenario_id)
+    except Exception:
+        return TaskResult(
+            *task,
+            succeeded=False,
+            wall_time=time.perf_counter() - start,
+            error=traceback.format_exc(),
+        )
+    return TaskResult(*task, succeeded=True, wall_time=time.perf_counter() - start)
+
+
+def get_sweep_batches(tasks) -> list:
+    """
+    Group tasks into one batch per simulation, in order of their first task.
+    """
+    scenario_ids = {}
+    for simulation_id, scenario_id in tasks:
+        scenario_ids.setdefault(simulation_id, []).append(scenario_id)
+    return [
+        SweepBatch(simulation_id, tuple(batch_scenario_ids))
+        for simulation_id, batch_scenario_ids in scenario_ids.items()
+    ]
+
+
+def run_batch(run_batch_fn, batch: SweepBatch) -> list:
+    """
+    Run a batch of tasks, capturing failures instead of raising them.
+
+    run_batch_fn returns the error of each task which failed (e.g. a dict of scenario_id to
+    traceback), the other tasks having succeeded. Returns a TaskResult per task, each with an
+    equal share of the batch's wall time. If run_batch_fn raises, all tasks are reported as
+    failed.
+    """
+    start = time.perf_counter()
+    try:
+        errors = run_batch_fn(batch.simulation_id, list(batch.scenario_ids))
+    except Exception:
+        error = traceback.format_exc()
+        errors = {scenario_id: error for scenario_id in batch.scenario_ids}
+    wall_time = (time.perf_counter() - start) / len(batch.scenario_ids)
+    return [
+        TaskResult(
+            batch.simulation_id,
+            scenario_id,
+            succeeded=scenario_id not in errors,
+            wall_time=wall_time,
+            error=errors.get(scenario_id),
+        )
+        for scenario_id in batch.scenario_ids
+    ]
+
+
+def run_sweep(run_fn, tasks, n_workers=1, chunksize=1):
+    """
+    Run run_fn(simulation_id, scenario_id) for every task, yielding a TaskResult per task in order.
+
+    run_fn must be a module-level function so that it can be sent to worker processes.
+    With n_workers > 1, consecutive chunks of chunksize tasks are sent to the same worker,
+    which lets tasks of one simulation share that worker's data caches.
+    """
+    task_fn = functools.partial(run_task, run_fn)
+
+    if n_workers <= 1:
+        yield from map(task_fn, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        yield from executor.map(task_fn, tasks, chunksize=chunksize)
+
+
+def run_batch_sweep(run_batch_fn, tasks, n_workers=1):
+    """
+    Run run_batch_fn(simulation_id, scenario_ids) once per simulation of tasks, yielding a
+    TaskResult per task, grouped by simulation.
+
+    run_batch_fn must be a module-level function so that it can be sent to worker processes.
+    """
+    batch_fn = functools.partial(run_batch, run_batch_fn)
+    batches = get_sweep_batches(tasks)
+
+    if n_workers <= 1:
+        for results in map(batch_fn, batches):
+            yield from results
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for results in executor.map(batch_fn, batches):
+            yield from results
@@ -0,0 +1,181 @@
+"""
+Vectorized generator of synthetic credit applications, following data-generator/src/credit_generator.jl.
+
+For each period, applicants are drawn from the same model:
+
+    age ~ TruncatedNormal(age_var, age_var, age_var / 4, 100)
+    idiosyncratic_individual_risk ~ TruncatedNormal(0, 1 / (5 * age), -10, 10)
+    total_default_risk_log_odds = idiosyncratic_individual_risk + age - 3
+    total_default_risk = logistic(total_default_risk_log_odds)
+    default ~ Bernoulli(total_default_risk)
+
+where age_var follows the business cycle in age_vars (stretched over the number of periods, see
+get_age_vars). All periods of a simulation are drawn at
+once, and simulations are generated on a process pool and written to the configured storage.
+Simulations are seeded individually, so the data does not depend on the number of workers.
+
+Run from this directory, e.g. `python synthetic_data.py --simulations 30 --applications 1000`
+(the prod settings of credit_generator.jl).
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit, ndtr, ndtri
+
+from storage import get_storage
+
+# NOTE: Age variable is an increasing function of time, as specified here for each time step
+age_vars = [0.25, 0.25, 0.3, 0.4, 0.5, 1, 1.2, 1.5, 2.0, 2.0]
+first_application_date = 2020
+
+
+def get_age_vars(n_periods: int) -> np.ndarray:
+    """
+    Business cycle of n_periods periods, following age_vars from start to end.
+
+    With 10 periods, this is age_vars itself.
+    """
+    return np.interp(
+        np.linspace(0, len(age_vars) - 1, n_periods),
+        np.arange(len(age_vars)),
+        age_vars,
+    )
+
+
+def truncated_normal(rng, loc, scale, lower, upper) -> np.ndarray:
+    """
+    Draws of normal distributions truncated to [lower, upper], by inverse transform sampling.
+    """
+    lower_cdf = ndtr((lower - loc) / scale)
+    upper_cdf = ndtr((upper - loc) / scale)
+    uniform = rng.uniform(lower_cdf, upper_cdf)
+    return loc + scale * ndtri(uniform)
+
+
+def get_uuids(rng, n) -> list:
+    """
+    Random (version 4) UUID strings drawn from rng, so that ids are reproducible too.
+    """
+    random_bytes = np.frombuffer(rng.bytes(16 * n), dtype="uint8").reshape(n, 16).copy()
+    random_bytes[:, 6] = random_bytes[:, 6] & 0x0F | 0x40
+    random_bytes[:, 8] = random_bytes[:, 8] & 0x3F | 0x80
+
+    # NOTE: Formatted as arrays of characters, which is several times faster than uuid.UUID
+    hex_chars = np.frombuffer(
+        random_bytes.tobytes().hex().encode(), dtype="uint8"
+    ).reshape(n, 32)
+    chars = np.full((n, 36), ord("-"), dtype="uint8")
+    chars[:, [i for i in range(36) if i not in (8, 13, 18, 23)]] = hex_chars
+    return chars.view("S36").ravel().astype(str).tolist()
+
+
+def generate_synthetic_data(
+    n_applications_per_period: int,
+    seed,
+    n_periods: int = len(age_vars),
+    first_application_date: int = first_application_date,
+) -> pd.DataFrame:
+    """
+    Synthetic applications of one simulation, with the columns written by credit_generator.jl.
+    """
+    age_vars = get_age_vars(n_periods)
+    rng = np.random.default_rng(seed)
+    simulation_id = get_uuids(rng, 1)[0]
+
+    age_var = np.repeat(age_vars, n_applications_per_period)
+    application_date = np.repeat(
+        np.arange(first_application_date, first_application_date + n_periods),
+        n_applications_per_period,
+    )
+
+    # NOTE: TruncatedNormal(mu, sigma, lower, upper), with age_var as both mean and scale
+    age = truncated_normal(rng, age_var, age_var, age_var / 4, 100)
+    idiosyncratic_individual_risk = truncated_normal(rng, 0, 1 / (age * 5), -10, 10)
+    total_default_risk_log_odds = idiosyncratic_individual_risk + age - 3
+    total_default_risk = expit(total_default_risk_log_odds)
+    default = (rng.uniform(size=age.shape[0]) < total_default_risk).astype("int64")
+
+    return pd.DataFrame(
+        {
+            "age": age,
+            "idiosyncratic_individual_risk": idiosyncratic_individual_risk,
+            "total_default_risk_log_odds": total_default_risk_log_odds,
+            "total_default_risk": total_default_risk,
+            "default": default,
+            "application_date": application_date.astype("int64"),
+            "age_var": age_var,
+            "application_id": get_uuids(rng, age.shape[0]),
+            "simulation_id": simulation_id,
+        }
+    )
+
+
+def write_synthetic_data(
+    n_applications_per_period: int,
+    seed,
+    n_periods: int = len(age_vars),
+    first_application_date: int = first_application_date,
+) -> str:
+    """
+    Generate one simulation and write it to the configured storage.
+    """
+    raw_df = generate_synthetic_data(
+        n_applications_per_period, seed, n_periods, first_application_date
+    )
+    simulation_id = raw_df.simulation_id.iloc[0]
+    get_storage().write_synthetic_data(simulation_id, raw_df)
+    return simulation_id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--simulations", type=int, default=75)
+    parser.add_argument(
+        "--applications",
+        type=int,
+        default=50,
+        help="applications per period and simulation",
+    )
+    parser.add_argument(
+        "--periods", type=int, default=len(age_vars), help="periods per simulation"
+    )
+    parser.add_argument(
+        "--first-date",
+        type=int,
+        default=first_application_date,
+        help="application date of the first period",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="generator processes"
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="keep existing synthetic data instead of clearing it first (use another --seed)",
+    )
+    args = parser.parse_args()
+
+    if not args.append:
+        get_storage().clear_synthetic_data()
+
+    seeds = np.random.SeedSequence(args.seed).spawn(args.simulations)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.workers) as executor:
+        for simulation_id in executor.map(
+            write_synthetic_data,
+            [args.applications] * args.simulations,
+            seeds,
+            [args.periods] * args.simulations,
+            [args.first_date] * args.simulations,
+            chunksize=max(1, args.simulations // (4 * args.workers)),
+        ):
+            print(f"Generated simulation {simulation_id}")
+    print(
+        f"Generated {args.simulations} simulations in {time.perf_counter() - start:.1f}s"
+    )
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from sklearn import linear_model
+
+from ledger import Ledger
+
+# NOTE: full refits on the complete history every period, as the model was originally trained;
+# warm_start refits the classifier on the accumulated training set, starting from the previous
+# coefficients, with the features standardized as at its first fit (its cost still grows with the
+# training set, but in fewer iterations); sgd only updates an SGDClassifier with the newly
+# observed outcomes, so it is the only mode whose cost per period stays flat
+training_modes = ["full", "warm_start", "sgd"]
+
+
+def get_classifier(training_mode: str):
+    """
+    Fetch the (untrained) classifier for a training mode.
+    """
+    if training_mode == "full":
+        return linear_model.LogisticRegression()
+    elif training_mode == "warm_start":
+        return linear_model.LogisticRegression(warm_start=True)
+    elif training_mode == "sgd":
+        return linear_model.SGDClassifier(loss="log", random_state=0)
+    raise ValueError(f"Unknown training_mode {training_mode}")
+
+
+class IncrementalModel:
+    """
+    Model pipeline together with the training data it has been fitted on so far.
+
+    The training set is kept as a ledger which grows by the newly observed outcomes of
+    each period, instead of being rebuilt from the full history. In warm_start mode, its
+    transformed features and labels are accumulated as well, so that only new rows are
+    transformed.
+    """
+
+    __slots__ = (
+        "model_pipeline",
+        "training_mode",
+        "X_vars",
+        "y_var",
+        "training_ledger",
+        "X_train",
+        "y_train",
+    )
+
+    def __init__(self, model_pipeline, training_mode: str, X_vars, y_var: str):
+        self.model_pipeline = model_pipeline
+        self.training_mode = training_mode
+        self.X_vars = X_vars
+        self.y_var = y_var
+        self.training_ledger = None
+        self.X_train = None
+        self.y_train = None
+
+    @property
+    def n_observed(self) -> int:
+        """
+        Number of training rows (observed outcomes) the model has seen.
+        """
+        return 0 if self.training_ledger is None else len(self.training_ledger)
+
+    def fit(self, training_df: pd.DataFrame) -> "IncrementalModel":
+        """
+        Fit the model from scratch on the complete training set.
+        """
+        self.training_ledger = Ledger.from_frame(training_df)
+        self.model_pipeline.fit(
+            training_df.loc[:, self.X_vars], training_df[self.y_var].astype("int")
+        )
+        return self
+
+    def partial_fit(self, new_training_df: pd.DataFrame) -> "IncrementalModel":
+        """
+        Update the model with training rows observed since the previous fit.
+        """
+        if new_training_df.shape[0] == 0:
+            return self
+
+        if self.training_ledger is None:
+            self.training_ledger = Ledger.from_frame(new_training_df)
+        else:
+            self.training_ledger = self.training_ledger.append(new_training_df)
+
+        # NOTE: Features are standardized as at the first fit, so that coefficients stay comparable
+        feature_pipeline = self.model_pipeline[:-1]
+        X_new = new_training_df.loc[:, self.X_vars]
+        if self.n_observed == new_training_df.shape[0]:
+            feature_pipeline.fit(X_new)
+        X_new = feature_pipeline.transform(X_new)
+        y_new = new_training_df[self.y_var].to_numpy().astype("int")
+
+        if self.training_mode == "sgd":
+            self.model_pipeline[-1].partial_fit(X_new, y_new, classes=[0, 1])
+        else:
+            if self.X_train is None:
+                self.X_train, self.y_train = X_new, y_new
+            else:
+                self.X_train = np.concatenate([self.X_train, X_new])
+                self.y_train = np.concatenate([self.y_train, y_new])
+            self.model_pipeline[-1].fit(self.X_train, self.y_train)
+        return self